@@ -6,15 +6,21 @@ import configparser
 import json
 import logging
 import os
+import threading
 import time
 import traceback
 from datetime import datetime, date, timedelta
 
-import pandas as pd
+import numpy as np
 import pyotp
 import requests
 from SmartApi import SmartConnect
 
+from cache import TTLCache
+from profiler import traced
+from resilience import BrokerError, BrokerRejectedError, CircuitBreaker, call_with_retry
+from option_chain import OptionChainSnapshot, OptionSeries, from_epoch_day, to_epoch_day
+
 # --- Configure Logging ---
 # Sets up a basic logger to output informational messages.
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -29,8 +35,27 @@ class AngelOneClient:
     # URLs and filenames used by the client.
     INSTRUMENT_LIST_URL = "https://margincalculator.angelbroking.com/OpenAPI_File/files/OpenAPIScripMaster.json"
     INSTRUMENT_FILE_NAME = "OpenAPIScripMaster.json"
+    INSTRUMENT_META_FILE_NAME = "OpenAPIScripMaster.meta.json"  # ETag / Last-Modified of the last download.
     OPTION_GREEKS_URL = "https://apiconnect.angelone.in/rest/secure/angelbroking/marketData/v1/optionGreek"
     REQUEST_INTERVAL_SECONDS = 1  # To avoid hitting API rate limits.
+    INSTRUMENT_REFRESH_INTERVAL_SECONDS = 3600  # Conditional re-check; a 304 is cheap.
+    DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+    # Response cache defaults; override in the [CACHE] section of config.ini.
+    LTP_CACHE_TTL_SECONDS = 1.0
+    GREEKS_CACHE_TTL_SECONDS = 3.0
+    CACHE_MAX_ENTRIES = 256
+    # Resilience defaults; override in the [RESILIENCE] section of config.ini.
+    RETRY_ATTEMPTS = 3
+    RETRY_BASE_DELAY_SECONDS = 0.2
+    RETRY_MAX_DELAY_SECONDS = 2.0
+    BREAKER_FAILURE_THRESHOLD = 5
+    BREAKER_RESET_SECONDS = 30.0
+    # Oldest response still served when a fresh request fails, in trading-loop
+    # intervals: the last good response is normally one cycle old. An explicit
+    # [RESILIENCE] STALE_MAX_AGE_SECONDS overrides it.
+    STALE_MAX_AGE_CYCLES = 1.5
+    GREEKS_REQUEST_TIMEOUT_SECONDS = 10
+    MIN_REQUEST_TIMEOUT_SECONDS = 1.0
 
     def __init__(self, config_path='config.ini'):
         """
@@ -50,7 +75,28 @@ class AngelOneClient:
         self.totp_key = self.config['ANGEL_ONE']['TOTP_KEY']
 
         self.smart_api_obj = None
-        self.instrument_list = None
+        # Only the columnar OPTIDX index is kept; the raw scrip master is
+        # discarded after parsing, as it is by far the largest allocation.
+        self.options_by_name = {}
+        self._instrument_lock = threading.Lock()
+        self._refresh_stop = threading.Event()
+        self._refresh_thread = None
+
+        # Identical LTP/greeks requests made within the TTL (by the trading loop,
+        # dashboard endpoints or several strategies) share a single broker call.
+        max_entries = self.config.getint('CACHE', 'MAX_ENTRIES', fallback=self.CACHE_MAX_ENTRIES)
+        self.ltp_cache = TTLCache(self.config.getfloat('CACHE', 'LTP_TTL_SECONDS', fallback=self.LTP_CACHE_TTL_SECONDS), max_entries)
+        self.greeks_cache = TTLCache(self.config.getfloat('CACHE', 'GREEKS_TTL_SECONDS', fallback=self.GREEKS_CACHE_TTL_SECONDS), max_entries)
+
+        # Retries, per-endpoint circuit breakers and stale fallback for broker calls.
+        self.retry_attempts = self.config.getint('RESILIENCE', 'RETRY_ATTEMPTS', fallback=self.RETRY_ATTEMPTS)
+        self.retry_base_delay = self.config.getfloat('RESILIENCE', 'RETRY_BASE_DELAY_SECONDS', fallback=self.RETRY_BASE_DELAY_SECONDS)
+        self.retry_max_delay = self.config.getfloat('RESILIENCE', 'RETRY_MAX_DELAY_SECONDS', fallback=self.RETRY_MAX_DELAY_SECONDS)
+        self.stale_max_age = self.config.getfloat('RESILIENCE', 'STALE_MAX_AGE_SECONDS', fallback=None)
+        failure_threshold = self.config.getint('RESILIENCE', 'BREAKER_FAILURE_THRESHOLD', fallback=self.BREAKER_FAILURE_THRESHOLD)
+        reset_seconds = self.config.getfloat('RESILIENCE', 'BREAKER_RESET_SECONDS', fallback=self.BREAKER_RESET_SECONDS)
+        self.breakers = {endpoint: CircuitBreaker(endpoint, failure_threshold, reset_seconds) for endpoint in ('ltp', 'greeks')}
+        self.cycle_deadline = None
 
         self._login()
         self._download_instrument_list()
@@ -98,26 +144,166 @@ class AngelOneClient:
 
     def _download_instrument_list(self):
         """
-        Downloads the master instrument list if it's missing or older than a day.
-        This is necessary to find correct option symbols and tokens.
+        Makes the master instrument list available and keeps it fresh.
+
+        If a copy already exists on disk it is loaded immediately (even if stale)
+        so that startup is not blocked on the download; the refresh then happens
+        in a background thread. Only a cold start with no file at all has to wait
+        for the first download.
         """
         logging.info("Checking for instrument list...")
-        if not os.path.exists(self.INSTRUMENT_FILE_NAME) or (time.time() - os.path.getmtime(self.INSTRUMENT_FILE_NAME) > 86400):
-            logging.info("Downloading latest instrument list...")
+        parsed = None
+        if not os.path.exists(self.INSTRUMENT_FILE_NAME):
+            logging.info("No local instrument list found. Downloading before startup...")
+            parsed = self._refresh_instrument_file()
+
+        self._load_instrument_list(parsed)
+
+        self._refresh_thread = threading.Thread(target=self._instrument_refresh_loop, name="instrument-refresh")
+        self._refresh_thread.daemon = True
+        self._refresh_thread.start()
+
+    def _instrument_refresh_loop(self):
+        """
+        Background loop that periodically re-validates the instrument list with a
+        conditional request and swaps a new index in when the file has changed.
+        """
+        # A file validated recently (e.g. just downloaded on a cold start) does not
+        # need to be re-checked until its interval has elapsed.
+        file_age = time.time() - os.path.getmtime(self.INSTRUMENT_FILE_NAME)
+        delay = max(0, self.INSTRUMENT_REFRESH_INTERVAL_SECONDS - file_age)
+        while not self._refresh_stop.wait(delay):
             try:
-                r = requests.get(self.INSTRUMENT_LIST_URL, timeout=15)
+                parsed = self._refresh_instrument_file()
+                if parsed is not None:
+                    self._load_instrument_list(parsed)
+            except Exception as e:
+                # Keep serving the current in-memory list; try again next interval.
+                logging.error(f"Background instrument list refresh failed: {e}")
+            delay = self.INSTRUMENT_REFRESH_INTERVAL_SECONDS
+
+    def _refresh_instrument_file(self):
+        """
+        Fetches the instrument list with a conditional, gzip-encoded, streaming
+        request and atomically replaces the local file.
+
+        The ETag and Last-Modified validators of the previous download are kept in
+        a small sidecar file so an unchanged list costs a single 304 response.
+        The body is streamed to a temporary file in the same directory and is
+        parsed before it is renamed over the real file, and the validators are
+        saved only after that. A crash mid-download, a truncated body or an
+        error page served with a 200 therefore never replaces a good list, and
+        the next check downloads the file again instead of getting a 304.
+
+        Returns:
+            tuple: The parsed (instrument_count, options_by_name) of the new file,
+                   or None if the server reported that the local copy is still current.
+
+        Raises:
+            ValueError: If the downloaded body is not a valid instrument list.
+        """
+        headers = {'Accept-Encoding': 'gzip'}
+        validators = self._read_instrument_validators()
+        if os.path.exists(self.INSTRUMENT_FILE_NAME):
+            if validators.get('etag'):
+                headers['If-None-Match'] = validators['etag']
+            if validators.get('last_modified'):
+                headers['If-Modified-Since'] = validators['last_modified']
+
+        tmp_path = f"{self.INSTRUMENT_FILE_NAME}.{os.getpid()}.tmp"
+        try:
+            with requests.get(self.INSTRUMENT_LIST_URL, headers=headers, stream=True, timeout=15) as r:
+                if r.status_code == 304:
+                    logging.info("Instrument list is up to date (304 Not Modified).")
+                    os.utime(self.INSTRUMENT_FILE_NAME)  # Mark the local copy as freshly validated.
+                    return False
                 r.raise_for_status()
-                with open(self.INSTRUMENT_FILE_NAME, "w", encoding='utf-8') as f:
-                    f.write(r.text)
-                logging.info("Instrument list downloaded.")
-            except requests.exceptions.RequestException as e:
-                logging.error(f"Error downloading instrument list: {e}")
-                raise
-        
-        with open(self.INSTRUMENT_FILE_NAME, "r", encoding='utf-8') as f:
-            self.instrument_list = json.load(f)
-        logging.info(f"Loaded {len(self.instrument_list)} instruments into memory.")
 
+                logging.info("Downloading latest instrument list...")
+                # iter_content transparently decodes the gzip transfer encoding.
+                with open(tmp_path, "wb") as f:
+                    for chunk in r.iter_content(chunk_size=self.DOWNLOAD_CHUNK_SIZE):
+                        f.write(chunk)
+                    f.flush()
+                    os.fsync(f.fileno())
+                parsed = self._parse_instrument_file(tmp_path)
+                os.replace(tmp_path, self.INSTRUMENT_FILE_NAME)
+
+                self._write_instrument_validators({
+                    'etag': r.headers.get('ETag'),
+                    'last_modified': r.headers.get('Last-Modified'),
+                })
+            logging.info("Instrument list downloaded.")
+            return parsed
+        except requests.exceptions.RequestException as e:
+            logging.error(f"Error downloading instrument list: {e}")
+            raise
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _read_instrument_validators(self):
+        """Reads the cached ETag/Last-Modified of the last download, if any."""
+        try:
+            with open(self.INSTRUMENT_META_FILE_NAME, "r", encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_instrument_validators(self, validators):
+        """Persists the ETag/Last-Modified validators, also via an atomic rename."""
+        tmp_path = f"{self.INSTRUMENT_META_FILE_NAME}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding='utf-8') as f:
+            json.dump(validators, f)
+        os.replace(tmp_path, self.INSTRUMENT_META_FILE_NAME)
+
+    def _parse_instrument_file(self, path):
+        """
+        Parses an instrument file and builds its option index.
+
+        Returns:
+            tuple: (instrument_count, options_by_name). The raw list itself is
+                   not returned, so it can be freed as soon as the index is built.
+
+        Raises:
+            ValueError: If the file is not a JSON list of instruments.
+        """
+        with open(path, "r", encoding='utf-8') as f:
+            instrument_list = json.load(f)
+        if not isinstance(instrument_list, list) or not instrument_list:
+            raise ValueError(f"{path} does not contain an instrument list.")
+        return len(instrument_list), self._build_option_index(instrument_list)
+
+    def _load_instrument_list(self, parsed=None):
+        """
+        Swaps a parsed option index in as the active one, parsing the local
+        file first unless `parsed` (from `_refresh_instrument_file`) is given.
+
+        Parsing happens outside the lock; the swap itself is a single reference
+        assignment, so readers in the trading loop never see a partially built
+        list. json.load does hold the GIL while it parses the ~40MB file, which
+        can stall the trading thread for about half a second; that happens only
+        at startup and when the server actually publishes a changed list.
+        """
+        instrument_count, options_by_name = parsed or self._parse_instrument_file(self.INSTRUMENT_FILE_NAME)
+        with self._instrument_lock:
+            self.options_by_name = options_by_name
+        logging.info(f"Indexed {sum(len(series.tokens) for series in options_by_name.values())} index options "
+                     f"out of {instrument_count} instruments.")
+
+    @staticmethod
+    def _build_option_index(instrument_list):
+        """
+        Groups index options (OPTIDX) by underlying name into columnar
+        OptionSeries, parsing strikes and expiries once per refresh.
+        """
+        grouped = {}
+        for item in instrument_list:
+            if item.get("instrumenttype") == "OPTIDX" and item.get("strike") and item.get("expiry"):
+                grouped.setdefault(item.get("name"), []).append(item)
+        return {name: OptionSeries.from_instruments(items) for name, items in grouped.items()}
+
+    @traced("AngelOneClient.get_live_equity_data")
     def get_live_equity_data(self, exchange, symbol_token):
         """
         Fetches the Last Traded Price (LTP) for a single instrument.
@@ -128,23 +314,32 @@ class AngelOneClient:
             symbol_token (str): The symbol token for the instrument.
 
         Returns:
-            float: The last traded price, or None if an error occurs.
+            tuple: (ltp, is_stale). `ltp` is the last traded price, or None if an
+                   error occurs; `is_stale` is True when it is a fallback from an
+                   earlier response because the fresh request failed.
         """
-        try:
-            response = self.smart_api_obj.ltpData(exchange, exchange, symbol_token)
-            if response.get("status") and response.get("data"):
-                ltp = response["data"]["ltp"]
-                logging.info(f"LTP for {symbol_token} on {exchange}: {ltp}")
+        return self._resilient_call(
+            'ltp', self.ltp_cache, (exchange, symbol_token),
+            lambda: self._fetch_live_equity_data(exchange, symbol_token),
+            f"LTP for {symbol_token}")
+
+    @traced("AngelOneClient._fetch_live_equity_data")
+    def _fetch_live_equity_data(self, exchange, symbol_token):
+        """Uncached, single-attempt LTP request; raises on failure. See `get_live_equity_data`."""
+        response = self.smart_api_obj.ltpData(exchange, exchange, symbol_token)
+        if response.get("status") and response.get("data"):
+            ltp = response["data"]["ltp"]
+            logging.info(f"LTP for {symbol_token} on {exchange}: {ltp}")
+            return ltp
+        logging.warning(f"Could not fetch LTP for {symbol_token}. Message: {response.get('message')}")
+        # Fallback for indices like SENSEX which may not work with ltpData
+        if exchange == "BSE":
+            ltp = self._get_ltp_from_candle(exchange, symbol_token)
+            if ltp is not None:
                 return ltp
-            else:
-                logging.warning(f"Could not fetch LTP for {symbol_token}. Message: {response.get('message')}")
-                # Fallback for indices like SENSEX which may not work with ltpData
-                if exchange == "BSE":
-                    return self._get_ltp_from_candle(exchange, symbol_token)
-                return None
-        except Exception as e:
-            logging.error(f"Error fetching LTP for {symbol_token}: {e}")
-            return None
+        if response.get("status") is False:
+            raise BrokerRejectedError(f"ltpData rejected the request: {response.get('message')}")
+        raise BrokerError(f"ltpData returned no data: {response.get('message')}")
 
     def _get_ltp_from_candle(self, exchange, symbol_token):
         """Workaround to get LTP for indices by fetching the last daily candle."""
@@ -168,6 +363,7 @@ class AngelOneClient:
             logging.error(f"Error in LTP candle workaround: {e}")
             return None
             
+    @traced("AngelOneClient.get_option_chain")
     def get_option_chain(self, index_name, ltp, num_strikes=5):
         """
         Finds the option chain for a given index around its LTP.
@@ -178,8 +374,8 @@ class AngelOneClient:
             num_strikes (int): The number of strikes to fetch above and below the At-The-Money strike.
 
         Returns:
-            list: A list of dictionaries, where each dictionary represents an option instrument.
-                  Returns an empty list if no options are found.
+            OptionChainSnapshot: The selected instruments of the nearest expiry, with
+                                 empty market columns, or None if no expiry is found.
         """
         logging.info(f"Fetching option chain for {index_name} around LTP {ltp}.")
         # These details would ideally be in a more dynamic config, but this is fine for now.
@@ -191,37 +387,32 @@ class AngelOneClient:
         today = now.date()
         min_expiry_date = today + timedelta(days=1) if now.time() > datetime.strptime("15:30", "%H:%M").time() else today
         
-        possible_expiries = {
-            datetime.strptime(item["expiry"], "%d%b%Y").date()
-            for item in self.instrument_list
-            if item.get("instrumenttype") == "OPTIDX" and item.get("name") == index_name and datetime.strptime(item.get("expiry", "01JAN1980"), "%d%b%Y").date() >= min_expiry_date
-        }
-        
-        if not possible_expiries:
+        # Take a local reference so a background refresh can swap the index mid-call.
+        series = self.options_by_name.get(index_name)
+        if series is None:
             logging.warning(f"No upcoming expiry found for {index_name}.")
-            return []
-            
-        target_expiry = min(possible_expiries)
-        target_expiry_str = target_expiry.strftime("%d%b%Y").upper()
-        logging.info(f"Targeting expiry date: {target_expiry_str}")
+            return None
+
+        upcoming = series.expiry_days >= to_epoch_day(min_expiry_date)
+        if not upcoming.any():
+            logging.warning(f"No upcoming expiry found for {index_name}.")
+            return None
+
+        target_expiry_day = int(series.expiry_days[upcoming].min())
+        logging.info(f"Targeting expiry date: {from_epoch_day(target_expiry_day).strftime('%d%b%Y').upper()}")
 
         # Determine the strike prices to fetch
         atm_strike = int(round(ltp / step) * step)
         strikes_to_find = [atm_strike + (i * step) for i in range(-num_strikes, num_strikes + 1)]
-        
+
         # Find matching instruments
-        option_chain = [
-            item for item in self.instrument_list
-            if item.get("name") == index_name and
-               item.get("instrumenttype") == "OPTIDX" and
-               item.get("expiry") == target_expiry_str and
-               item.get("strike") and
-               (float(item.get("strike")) / 100.0) in strikes_to_find
-        ]
-
-        logging.info(f"Found {len(option_chain)} options in the chain for {index_name}.")
-        return option_chain
+        rows = np.flatnonzero((series.expiry_days == target_expiry_day) & np.isin(series.strikes, strikes_to_find))
+        snapshot = OptionChainSnapshot.from_series(index_name, ltp, target_expiry_day, series, rows)
 
+        logging.info(f"Found {len(snapshot)} options in the chain for {index_name}.")
+        return snapshot
+
+    @traced("AngelOneClient.get_option_greeks")
     def get_option_greeks(self, index_name, expiry_date):
         """
         Fetches option greeks by making a direct, authenticated HTTP request.
@@ -232,40 +423,103 @@ class AngelOneClient:
             expiry_date (str): The expiry date in 'DDMMMYYYY' format (e.g., '07AUG2025').
 
         Returns:
-            list: A list of dictionaries containing the greeks data, or None.
+            tuple: (greeks_data, is_stale). `greeks_data` is a list of dictionaries
+                   containing the greeks data, or None; it may be shared with other
+                   callers through the cache and must not be modified. `is_stale`
+                   is True when it is a fallback from an earlier response.
         """
+        return self._resilient_call(
+            'greeks', self.greeks_cache, (index_name, expiry_date),
+            lambda: self._fetch_option_greeks(index_name, expiry_date),
+            f"Greeks for {index_name} {expiry_date}")
+
+    @traced("AngelOneClient._fetch_option_greeks")
+    def _fetch_option_greeks(self, index_name, expiry_date):
+        """Uncached, single-attempt greeks request; raises on failure. See `get_option_greeks`."""
         logging.info(f"Fetching greeks for {index_name} with expiry {expiry_date}...")
+        headers = {
+            'Authorization': f'Bearer {self.access_token}',
+            'Content-Type': 'application/json', 'Accept': 'application/json',
+            'X-UserType': 'USER', 'X-SourceID': 'WEB', 'X-ClientLocalIP': '192.168.1.1',
+            'X-ClientPublicIP': '192.168.1.1', 'X-MACAddress': '00:00:00:00:00:00',
+            'X-PrivateKey': self.api_key
+        }
+        request_body = {"name": index_name, "expirydate": expiry_date}
+
+        response = requests.post(self.OPTION_GREEKS_URL, headers=headers, json=request_body,
+                                 timeout=self._request_timeout(self.GREEKS_REQUEST_TIMEOUT_SECONDS))
+        response.raise_for_status()
+        response_data = response.json()
+
+        if response_data and response_data.get("status"):
+            greeks_data = response_data.get("data", [])
+            logging.info(f"Successfully fetched {len(greeks_data)} greeks records for {index_name}.")
+            return greeks_data
+        if not response_data:
+            raise BrokerError("optionGreek returned an empty response")
+        raise BrokerRejectedError(f"optionGreek rejected the request: {response_data.get('message', 'Unknown error')}")
+
+    def _resilient_call(self, endpoint, cache, key, fetch, description):
+        """
+        Runs a broker request through the endpoint's cache, retry policy and
+        circuit breaker.
+
+        Concurrent identical requests are coalesced by the cache, so one
+        retry sequence serves all of them. Retries use jittered exponential
+        backoff and never start past the current cycle deadline. If the
+        request still fails, or the circuit is open, the last good response
+        is returned as long as it is no older than the stale max age (see
+        `set_run_interval`), and flagged as stale so callers can avoid trading on it.
+
+        Returns:
+            tuple: (response, is_stale), or (None, False) if nothing usable is available.
+        """
+        def load():
+            return call_with_retry(
+                fetch, self.breakers[endpoint],
+                attempts=self.retry_attempts,
+                base_delay=self.retry_base_delay,
+                max_delay=self.retry_max_delay,
+                deadline=self.cycle_deadline,
+            )
+
         try:
-            headers = {
-                'Authorization': f'Bearer {self.access_token}',
-                'Content-Type': 'application/json', 'Accept': 'application/json',
-                'X-UserType': 'USER', 'X-SourceID': 'WEB', 'X-ClientLocalIP': '192.168.1.1',
-                'X-ClientPublicIP': '192.168.1.1', 'X-MACAddress': '00:00:00:00:00:00',
-                'X-PrivateKey': self.api_key
-            }
-            request_body = {"name": index_name, "expirydate": expiry_date}
-            
-            response = requests.post(self.OPTION_GREEKS_URL, headers=headers, json=request_body, timeout=10)
-            response.raise_for_status()
-            response_data = response.json()
-
-            if response_data and response_data.get("status"):
-                greeks_data = response_data.get("data", [])
-                logging.info(f"Successfully fetched {len(greeks_data)} greeks records for {index_name}.")
-                return greeks_data
-            else:
-                logging.warning(f"Could not fetch greeks for {index_name}: {response_data.get('message', 'Unknown error')}")
-                return None
-        except requests.exceptions.RequestException as e:
-            logging.error(f"HTTP request error fetching greeks for {index_name}: {e}")
+            return cache.get_or_load(key, load), False
         except Exception as e:
-            logging.error(f"An unexpected error occurred fetching greeks for {index_name}: {e}")
-            logging.error(traceback.format_exc())
-        return None
+            stale = cache.get_stale(key, self.stale_max_age) if self.stale_max_age else None
+            if stale is not None:
+                logging.warning(f"{description} failed ({e}). Falling back to the last good response.")
+                return stale, True
+            logging.error(f"{description} failed: {e}")
+            return None, False
+
+    def set_cycle_deadline(self, deadline):
+        """Sets the epoch time by which the current trading cycle must finish; retries stop there."""
+        self.cycle_deadline = deadline
+
+    def set_run_interval(self, interval_seconds):
+        """Ties the stale fallback's maximum age to the trading loop's interval, unless configured explicitly."""
+        if not self.config.has_option('RESILIENCE', 'STALE_MAX_AGE_SECONDS'):
+            self.stale_max_age = self.STALE_MAX_AGE_CYCLES * interval_seconds
+
+    def _request_timeout(self, limit):
+        """Caps a request's timeout at `limit` and at the time left in the current cycle."""
+        if self.cycle_deadline is None:
+            return limit
+        return max(self.MIN_REQUEST_TIMEOUT_SECONDS, min(limit, self.cycle_deadline - time.time()))
+
+    def cache_stats(self):
+        """Returns hit/miss/coalescing counters of the per-endpoint response caches."""
+        return {'ltp': self.ltp_cache.stats(), 'greeks': self.greeks_cache.stats()}
+
+    def breaker_stats(self):
+        """Returns the state of each endpoint's circuit breaker."""
+        return {endpoint: breaker.stats() for endpoint, breaker in self.breakers.items()}
 
     def logout(self):
         """Logs out of the current session."""
         logging.info("Logging out...")
+        self._refresh_stop.set()
         try:
             if self.smart_api_obj:
                 self.smart_api_obj.terminateSession(self.client_id)
@@ -306,33 +560,29 @@ if __name__ == '__main__':
             print(f"\n{'='*20} Processing: {index_name} {'='*20}")
             
             # Get live price of the underlying index
-            ltp = client.get_live_equity_data(details['exchange'], details['token'])
+            ltp, _ = client.get_live_equity_data(details['exchange'], details['token'])
             if ltp is None:
                 print(f"Could not get LTP for {index_name}. Skipping.")
                 continue
 
             # Get the option chain based on the LTP
-            option_chain_instruments = client.get_option_chain(index_name, ltp)
-            if not option_chain_instruments:
+            snapshot = client.get_option_chain(index_name, ltp)
+            if not snapshot:
                 print(f"Could not get option chain for {index_name}. Skipping.")
                 continue
 
-            # The greeks endpoint needs the expiry date. We can get it from the first instrument.
-            target_expiry = option_chain_instruments[0]['expiry']
+            # The greeks endpoint needs the expiry date of the chain.
+            target_expiry = snapshot.expiry_str
             
             # Get the greeks for that entire expiry series
-            greeks_data = client.get_option_greeks(index_name, target_expiry)
+            greeks_data, _ = client.get_option_greeks(index_name, target_expiry)
 
             # Now you have LTP, the full option chain, and the greeks.
-            # You can combine them and pass them to the pricing model.
             print(f"LTP: {ltp}")
-            print(f"Found {len(option_chain_instruments)} options for expiry {target_expiry}.")
+            print(f"Found {len(snapshot)} options for expiry {target_expiry}.")
             if greeks_data:
-                print(f"Found {len(greeks_data)} greeks records.")
-            
-            # --- Next Step: Combine and Analyze ---
-            # Here, you would merge this data and feed it into your Black-Scholes model.
-            # For example, create a pandas DataFrame to easily merge the data.
+                matched = snapshot.attach_greeks(greeks_data)
+                print(f"Attached {matched} of {len(greeks_data)} greeks records to the chain.")
             
             # *** FIX: Access the variable through the client object ***
             time.sleep(client.REQUEST_INTERVAL_SECONDS) # Be respectful of API limits
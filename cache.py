@@ -0,0 +1,125 @@
+# /engine/cache.py
+# This module provides a small thread-safe TTL cache used by the API client to
+# avoid repeating identical broker requests made within a short window.
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class _Flight:
+    """A load in progress; concurrent callers for the same key wait on it."""
+    __slots__ = ('event', 'value', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TTLCache:
+    """
+    A thread-safe cache with per-entry expiry, LRU eviction and single-flight
+    loading: when several threads miss on the same key at once, only one of
+    them calls the loader and the others wait for and share its result.
+
+    Cached values are shared between callers and must be treated as read-only.
+    """
+    def __init__(self, ttl_seconds, maxsize=128):
+        self.ttl_seconds = ttl_seconds
+        self.maxsize = maxsize
+        self._entries = OrderedDict()  # key -> (value, expires_at), least recently used first
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.stale_hits = 0
+
+    def get_or_load(self, key, loader, cacheable=lambda value: value is not None):
+        """
+        Returns the fresh cached value for `key`, or calls `loader()` to get it.
+
+        Args:
+            key: Any hashable identifying the request.
+            loader (callable): Fetches the value; its exceptions propagate to
+                every caller waiting on this load.
+            cacheable (callable): Decides whether a loaded value is stored.
+                By default failed (None) results are not cached.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = loader()
+            if cacheable(flight.value):
+                self.set(key, flight.value)
+            return flight.value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            flight.event.set()
+
+    def get_stale(self, key, max_age_seconds):
+        """
+        Returns the last stored value for `key`, even if expired, provided it
+        was stored no more than `max_age_seconds` ago; otherwise None. Used as a
+        fallback when a fresh load fails.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if time.monotonic() - (expires_at - self.ttl_seconds) > max_age_seconds:
+                return None
+            self.stale_hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'evictions': self.evictions,
+                'stale_hits': self.stale_hits,
+                'hit_ratio': round((self.hits + self.coalesced) / lookups, 4) if lookups else None,
+            }
@@ -1,22 +1,30 @@
 # engine.py
 # VERSION 2.2: Includes a Flask web server for free hosting on platforms like Render/Heroku.
 
+import atexit
 import configparser
+import hashlib
 import logging
+import signal
+import sys
+import tempfile
 import time
 import traceback
-from datetime import datetime, time as dt_time
+from datetime import datetime, timezone
 import os
-import pytz
-from threading import Thread # <-- Import Thread
+from threading import Thread, get_ident # <-- Import Thread
 
 # --- NEW: Import Flask ---
-from flask import Flask
+from flask import Flask, Response, abort, jsonify, request, stream_with_context
 
-import pandas as pd
+import numpy as np
 from api import AngelOneClient
 from portfolio_manager import PortfolioManager
-from pricing_model import black_scholes
+from pricing_model import smile_fair_values, time_to_expiry_years
+from profiler import TRACER, SamplingProfiler, traced
+from scheduler import IST, CycleScheduler, MarketCalendar
+from sharding import ShardSupervisor
+from strategies import StrategyContext, StrategyRunner, load_strategies
 
 # --- NEW: Create a Flask App ---
 # This gives us a web endpoint to ping.
@@ -27,40 +35,173 @@ def home():
     """A simple endpoint to show the engine is running and to be pinged."""
     return "Trading engine is alive."
 
+# --- Read API ---
+# Dashboards read the portfolio through these endpoints. They use their own
+# PortfolioManager (SQLite in WAL mode allows reads alongside the writer), and
+# every response carries an ETag derived from a cheap table fingerprint, so a
+# poll that finds nothing new is answered with a 304 without reading any rows.
+READ_API_MAX_AGE_SECONDS = 5
+READ_API_MAX_PAGE_SIZE = 1000
+EXPORT_CHUNK_BYTES = 64 * 1024
+_read_portfolio = None
+
+def get_read_portfolio():
+    # Read-only: the trading loop (or, when sharded, the writer process) owns the database and its schema.
+    global _read_portfolio
+    if _read_portfolio is None:
+        _read_portfolio = PortfolioManager(read_only=True)
+    return _read_portfolio
+
+def _parse_utc(value):
+    """Parses an ISO 8601 datetime as the naive UTC the database stores; naive input is taken as UTC."""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def _parse_trade_filters():
+    """Reads the symbol/start/end filters shared by the trade endpoints."""
+    try:
+        start = _parse_utc(request.args['start']) if request.args.get('start') else None
+        end = _parse_utc(request.args['end']) if request.args.get('end') else None
+    except ValueError:
+        abort(400, description="'start' and 'end' must be ISO 8601 datetimes (UTC unless an offset is given).")
+    return {'symbol': request.args.get('symbol') or None, 'start': start, 'end': end}
+
+def _conditional(version):
+    """
+    Returns (etag, not_modified_response). The ETag covers the table version
+    and the full query string, since both determine the response body.
+    """
+    etag = hashlib.sha1(f"{request.path}?{request.query_string.decode()}#{version}".encode()).hexdigest()
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = None
+    return etag, response
+
+def _cached(response, etag):
+    response.set_etag(etag)
+    response.cache_control.max_age = READ_API_MAX_AGE_SECONDS
+    response.cache_control.private = True
+    return response
+
+@app.route('/trades')
+def trades():
+    """One keyset-paginated page of trade history, newest first. Use `next_cursor` as `cursor` for the next page."""
+    portfolio = get_read_portfolio()
+    etag, not_modified = _conditional(portfolio.trade_history_version())
+    if not_modified:
+        return _cached(not_modified, etag)
+    filters = _parse_trade_filters()
+    limit = min(request.args.get('limit', 100, type=int), READ_API_MAX_PAGE_SIZE)
+    try:
+        page, next_cursor = portfolio.get_trade_history_page(max(limit, 1), request.args.get('cursor'), **filters)
+    except ValueError:
+        abort(400, description="Invalid cursor.")
+    return _cached(jsonify({'trades': page, 'next_cursor': next_cursor}), etag)
+
+@app.route('/holdings')
+def holdings():
+    """All current holdings."""
+    portfolio = get_read_portfolio()
+    etag, not_modified = _conditional(portfolio.holdings_version())
+    if not_modified:
+        return _cached(not_modified, etag)
+    return _cached(jsonify({'holdings': list(portfolio.iter_holdings())}), etag)
+
+@app.route('/trades/export.csv')
+def export_trades_csv():
+    """Streams the (filtered) trade history as CSV in bounded chunks."""
+    portfolio = get_read_portfolio()
+    etag, not_modified = _conditional(portfolio.trade_history_version())
+    if not_modified:
+        return _cached(not_modified, etag)
+    body = stream_with_context(portfolio.export_trade_history_csv(**_parse_trade_filters()))
+    response = Response(body, mimetype='text/csv')
+    response.headers['Content-Disposition'] = 'attachment; filename=trade_history.csv'
+    return _cached(response, etag)
+
+@app.route('/trades/export.parquet')
+def export_trades_parquet():
+    """
+    Streams the (filtered) trade history as Parquet. The file is built row
+    group by row group in a spooled temporary file (Parquet needs its footer
+    written last) and then streamed out in chunks.
+    """
+    portfolio = get_read_portfolio()
+    etag, not_modified = _conditional(portfolio.trade_history_version())
+    if not_modified:
+        return _cached(not_modified, etag)
+    spool = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    try:
+        portfolio.export_trade_history_parquet(spool, **_parse_trade_filters())
+    except ImportError as e:
+        spool.close()
+        abort(501, description=str(e))
+    spool.seek(0)
+
+    def generate():
+        with spool:
+            while True:
+                chunk = spool.read(EXPORT_CHUNK_BYTES)
+                if not chunk:
+                    return
+                yield chunk
+
+    response = Response(generate(), mimetype='application/vnd.apache.parquet')
+    response.headers['Content-Disposition'] = 'attachment; filename=trade_history.parquet'
+    return _cached(response, etag)
+
+# Set when the engine runs in the process-sharded deployment mode.
+shard_supervisor = None
+
+@app.route('/shards')
+def shards():
+    """Reports the state of each shard and the portfolio writer in sharded mode."""
+    if shard_supervisor is None:
+        return jsonify({'mode': 'threaded'})
+    return jsonify({'mode': 'sharded', 'processes': shard_supervisor.status()})
+
 # --- Configure Logging ---
+# force=True: the modules imported above already configured the root logger,
+# which would otherwise make this call (and the process name tag) a no-op.
 logging.basicConfig(
+    force=True,
     level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - [ENGINE] - %(message)s',
+    format='%(asctime)s - %(levelname)s - [ENGINE:%(processName)s] - %(message)s',
     handlers=[
         logging.FileHandler("engine.log"),
         logging.StreamHandler()
     ]
 )
 
-IST = pytz.timezone('Asia/Kolkata')
-MARKET_OPEN_TIME = dt_time(9, 15)
-MARKET_CLOSE_TIME = dt_time(15, 30)
 
 class TradingEngine:
     """
     The main class that orchestrates the trading strategy.
     """
-    def __init__(self, config_path='config.ini'):
+    def __init__(self, config_path='config.ini', symbols=None, portfolio_manager=None):
+        """
+        Args:
+            config_path (str): The path to the configuration file.
+            symbols (list, optional): Indices to trade; defaults to SYMBOLS_TO_WATCH.
+                                      Used by sharded deployments to give each shard its subset.
+            portfolio_manager (optional): Where trades are recorded; defaults to a local
+                                          PortfolioManager. Shards pass a QueuedPortfolioWriter.
+        """
         logging.info("🚀 Starting Trading Engine v2.2...")
         self.config = self._load_config(config_path)
         
         # Load settings... (rest of the __init__ method is the same)
-        self.symbols_to_watch = self.config['TRADING_ENGINE']['SYMBOLS_TO_WATCH'].split(',')
+        self.symbols_to_watch = symbols or self.config['TRADING_ENGINE']['SYMBOLS_TO_WATCH'].split(',')
         self.run_interval_seconds = int(self.config['TRADING_ENGINE']['RUN_INTERVAL_SECONDS'])
-        self.trade_trigger_percentage = float(self.config['TRADING_ENGINE']['TRADE_TRIGGER_PERCENTAGE'])
         self.risk_free_rate = float(self.config['TRADING_ENGINE']['RISK_FREE_RATE'])
-        self.trade_quantity = int(self.config['TRADING_ENGINE']['TRADE_QUANTITY'])
-        self.expiry_strategy_enabled = self.config.getboolean('EXPIRY_STRATEGY', 'ENABLED', fallback=False)
-        self.max_iv_rank = self.config.getfloat('EXPIRY_STRATEGY', 'MAX_STRADDLE_IV_RANK', fallback=20.0)
-        self.expiry_weekday = self.config.getint('EXPIRY_STRATEGY', 'EXPIRY_WEEKDAY', fallback=3)
-        self.strategy_start_time = dt_time.fromisoformat(self.config.get('EXPIRY_STRATEGY', 'STRATEGY_START_TIME', fallback='14:55:00'))
+        self.market_calendar = MarketCalendar.from_config(self.config)
+        self.scheduler = CycleScheduler(self.run_interval_seconds, self.market_calendar)
+        self.thread_id = None
         self.session_iv_tracker = {}
-        self.expiry_trade_fired_today = {}
+        self.smile_params = {}  # (index_name, expiry) -> last fitted SVI parameters, used as a warm start.
         self.symbol_details = {
             "NIFTY": {"token": "99926000", "exchange": "NSE"},
             "BANKNIFTY": {"token": "99926009", "exchange": "NSE"},
@@ -70,7 +211,9 @@ class TradingEngine:
         pin = os.environ.get('PIN') or self.config['ANGEL_ONE']['PIN']
         totp_key = os.environ.get('TOTP_KEY') or self.config['ANGEL_ONE']['TOTP_KEY']
         self.api_client = AngelOneClient(api_key, client_id, pin, totp_key)
-        self.portfolio_manager = PortfolioManager()
+        self.api_client.set_run_interval(self.run_interval_seconds)
+        self.portfolio_manager = portfolio_manager or PortfolioManager()
+        self.strategy_runner = StrategyRunner(load_strategies(self.config), self.portfolio_manager)
         logging.info("Engine initialized successfully.")
 
     def _load_config(self, config_path):
@@ -79,68 +222,68 @@ class TradingEngine:
             raise ValueError(f"Configuration file not found at {config_path}")
         return parser
     
-    def is_market_open(self):
-        now_ist = datetime.now(IST)
-        if now_ist.weekday() > 4: return False, "Weekend"
-        if MARKET_OPEN_TIME <= now_ist.time() <= MARKET_CLOSE_TIME: return True, "Market is Open"
-        return False, "Market is Closed"
-
     def run(self):
         """The main trading loop, designed to run in a background thread."""
         logging.info("Trading logic thread started.")
-        while True:
-            try:
-                market_open, reason = self.is_market_open()
-                if not market_open:
-                    logging.info(f"Market is currently closed ({reason}). Sleeping for 15 minutes...")
-                    time.sleep(900)
-                    continue
-
-                logging.info(f"{'='*20} Starting New Trading Cycle {'='*20}")
-                for index_name in self.symbols_to_watch:
+        self.thread_id = get_ident()  # Target of the on-demand sampling profiler.
+        while self.scheduler.wait_for_next_cycle():
+            TRACER.start_cycle()
+            # Broker retries must not run past the point the next cycle is due.
+            self.api_client.set_cycle_deadline(self.scheduler.deadline)
+            logging.info(f"{'='*20} Starting New Trading Cycle {'='*20}")
+            for index_name in self.symbols_to_watch:
+                # Each index is isolated: an error costs that index this cycle only,
+                # and the next cycle still starts on schedule.
+                try:
                     self.process_index(index_name)
-                    time.sleep(self.api_client.REQUEST_INTERVAL_SECONDS)
-
-                logging.info(f"Cycle finished. Waiting for {self.run_interval_seconds} seconds...")
-                time.sleep(self.run_interval_seconds)
-            except Exception as e:
-                logging.error(f"An error occurred in the trading loop: {e}")
-                traceback.print_exc()
-                # Wait before retrying to avoid spamming logs on a persistent error
-                time.sleep(60)
+                except Exception as e:
+                    logging.error(f"An error occurred while processing {index_name}: {e}")
+                    traceback.print_exc()
+                time.sleep(self.api_client.REQUEST_INTERVAL_SECONDS)
+            TRACER.end_cycle()
+            duration = self.scheduler.complete_cycle()
+            next_cycle = datetime.fromtimestamp(self.scheduler.deadline, IST)
+            logging.info(f"Cycle finished in {duration:.2f}s. Next cycle due at {next_cycle.strftime('%H:%M:%S')}.")
 
     # ... (The rest of your TradingEngine class methods: process_index, update_session_iv, etc. remain unchanged) ...
+    @traced("TradingEngine.process_index")
     def process_index(self, index_name):
         logging.info(f"--- Processing Index: {index_name} ---")
         details = self.symbol_details[index_name]
-        underlying_ltp = self.api_client.get_live_equity_data(details['exchange'], details['token'])
+        underlying_ltp, ltp_stale = self.api_client.get_live_equity_data(details['exchange'], details['token'])
         if underlying_ltp is None:
             logging.error(f"Could not get LTP for {index_name}. Skipping.")
             return
-        option_chain = self.api_client.get_option_chain(index_name, underlying_ltp)
-        if not option_chain:
+        snapshot = self.api_client.get_option_chain(index_name, underlying_ltp)
+        if not snapshot:
             logging.warning(f"Could not get option chain for {index_name}. Skipping.")
             return
-        target_expiry_str = option_chain[0]['expiry']
-        greeks_data = self.api_client.get_option_greeks(index_name, target_expiry_str)
+        greeks_data, greeks_stale = self.api_client.get_option_greeks(index_name, snapshot.expiry_str)
         if not greeks_data:
             logging.warning(f"Could not get greeks for {index_name}. Skipping.")
             return
-        df_chain = pd.DataFrame(option_chain)
-        df_greeks = pd.DataFrame(greeks_data)
-        df_merged = pd.merge(df_chain, df_greeks, on='token', how='inner')
-        logging.info(f"Successfully merged {len(df_merged)} options with their greeks.")
-        self.update_session_iv(index_name, df_merged, underlying_ltp)
-        for _, option in df_merged.iterrows():
-            self.analyze_and_trade_value(option, underlying_ltp)
-        if self.expiry_strategy_enabled:
-            self.execute_expiry_straddle_strategy(index_name, df_merged, underlying_ltp)
-    def update_session_iv(self, index_name, df_merged, underlying_ltp):
+        matched = snapshot.attach_greeks(greeks_data)
+        snapshot.stale = ltp_stale or greeks_stale
+        logging.info(f"Successfully joined {matched} options with their greeks.")
+        self.update_session_iv(snapshot)
+        fair_values = self.update_smile_fair_values(snapshot)
+        if fair_values is None:
+            logging.warning(f"Could not fit a volatility smile for {index_name}. Fair values are unavailable this cycle.")
+        # Market data is prepared once per cycle and shared by every strategy.
+        context = StrategyContext(
+            snapshot=snapshot,
+            fair_values=fair_values,
+            iv_tracker=dict(self.session_iv_tracker[index_name]) if index_name in self.session_iv_tracker else None,
+            now=datetime.now(IST),
+            stale=snapshot.stale,
+        )
+        self.strategy_runner.run(context)
+    def update_session_iv(self, snapshot):
+        index_name = snapshot.index_name
         try:
-            df_merged['strike_price'] = df_merged['strike'].astype(float) / 100.0
-            atm_strike = df_merged.iloc[(df_merged['strike_price'] - underlying_ltp).abs().argsort()[:1]]
-            if atm_strike.empty: return
-            current_iv = atm_strike.iloc[0]['iv']
+            atm_row = snapshot.atm_row(np.isfinite(snapshot.iv))
+            if atm_row is None: return
+            current_iv = float(snapshot.iv[atm_row])
             if index_name not in self.session_iv_tracker:
                 self.session_iv_tracker[index_name] = {'high': current_iv, 'low': current_iv}
                 logging.info(f"Initialized IV tracker for {index_name}: High={current_iv}, Low={current_iv}")
@@ -150,70 +293,140 @@ class TradingEngine:
             logging.debug(f"IV Tracker for {index_name}: High={self.session_iv_tracker[index_name]['high']}, Low={self.session_iv_tracker[index_name]['low']}")
         except Exception as e:
             logging.error(f"Error updating session IV for {index_name}: {e}")
-    def execute_expiry_straddle_strategy(self, index_name, df_merged, underlying_ltp):
-        now = datetime.now(IST)
-        if self.expiry_trade_fired_today.get(index_name) == now.date(): return
-        if now.weekday() != self.expiry_weekday or now.time() < self.strategy_start_time: return
-        logging.info(f"*** ACTIVATING EXPIRY STRADDLE STRATEGY FOR {index_name} ***")
-        try:
-            tracker = self.session_iv_tracker.get(index_name)
-            if not tracker:
-                logging.warning(f"No IV tracker data for {index_name} to calculate rank. Skipping.")
-                return
-            iv_high, iv_low = tracker['high'], tracker['low']
-            df_merged['strike_price'] = df_merged['strike'].astype(float) / 100.0
-            atm_option_row = df_merged.iloc[(df_merged['strike_price'] - underlying_ltp).abs().argsort()[:1]]
-            current_iv = atm_option_row.iloc[0]['iv']
-            iv_range = iv_high - iv_low
-            session_iv_rank = 50.0 if iv_range == 0 else ((current_iv - iv_low) / iv_range) * 100
-            logging.info(f"Current IV: {current_iv:.2f}, Day's Range: [{iv_low:.2f} - {iv_high:.2f}], Session IV Rank: {session_iv_rank:.2f}%")
-            if session_iv_rank < self.max_iv_rank:
-                logging.info(f"SUCCESS: IV Rank ({session_iv_rank:.2f}%) is below threshold ({self.max_iv_rank}%)! EXECUTING STRADDLE.")
-                atm_strike_price = atm_option_row.iloc[0]['strike_price']
-                atm_call = df_merged[(df_merged['strike_price'] == atm_strike_price) & (df_merged['symbol'].str.endswith('CE'))].iloc[0]
-                atm_put = df_merged[(df_merged['strike_price'] == atm_strike_price) & (df_merged['symbol'].str.endswith('PE'))].iloc[0]
-                reason = f"Expiry Straddle: IV Rank {session_iv_rank:.2f}% < {self.max_iv_rank}%"
-                self.portfolio_manager.record_trade(atm_call['symbol'], "BUY", self.trade_quantity, atm_call['ltp_y'], reason)
-                self.portfolio_manager.record_trade(atm_put['symbol'], "BUY", self.trade_quantity, atm_put['ltp_y'], reason)
-                self.expiry_trade_fired_today[index_name] = now.date()
-            else:
-                logging.info(f"IV Rank ({session_iv_rank:.2f}%) is NOT below threshold ({self.max_iv_rank}%). No trade.")
-        except Exception as e:
-            logging.error(f"Error during expiry straddle strategy for {index_name}: {e}")
-            logging.error(traceback.format_exc())
-    def analyze_and_trade_value(self, option_data, underlying_ltp):
+    def update_smile_fair_values(self, snapshot):
+        """
+        Fits this cycle's volatility smile for the snapshot's expiry and returns
+        each option's fair value priced off the fitted surface (aligned with the
+        snapshot rows, NaN where unavailable), or None if the fit failed.
+        The fit is warm-started from the previous cycle's parameters.
+        """
+        index_name = snapshot.index_name
         try:
-            symbol = option_data['symbol']
-            option_type = option_data['symbol'][-2:]
-            market_price = option_data['ltp_y']
-            strike_price = float(option_data['strike']) / 100.0
-            implied_vol = option_data['iv'] / 100.0
-            if market_price <= 0 or implied_vol <= 0: return
-            expiry_date_obj = datetime.strptime(option_data['expiry'], '%d%b%Y').date()
-            fair_value = black_scholes(option_type, underlying_ltp, strike_price, expiry_date_obj, self.risk_free_rate, implied_vol)
-            if fair_value <= 0: return
-            price_difference_pct = ((fair_value - market_price) / market_price) * 100
-            logging.debug(f"Value Analyzed {symbol}: Market={market_price:.2f}, FairValue={fair_value:.2f}, Diff={price_difference_pct:.2f}%")
-            if price_difference_pct > self.trade_trigger_percentage:
-                reason = f"Value BUY: Fair value ({fair_value:.2f}) is {price_difference_pct:.2f}% > market price ({market_price:.2f})."
-                logging.info(reason)
-                self.portfolio_manager.record_trade(symbol, "BUY", self.trade_quantity, market_price, reason)
+            T = time_to_expiry_years(snapshot.expiry_date)
+            key = (index_name, snapshot.expiry_day)
+            fair_values, params = smile_fair_values(
+                snapshot.is_call,
+                snapshot.underlying_ltp,
+                snapshot.strikes,
+                T,
+                self.risk_free_rate,
+                snapshot.iv / 100.0,
+                self.smile_params.get(key),
+            )
+            if params is None:
+                return None
+            # Drop warm starts for expiries that have rolled off.
+            self.smile_params = {k: v for k, v in self.smile_params.items() if k[0] != index_name}
+            self.smile_params[key] = params
+            return fair_values
         except Exception as e:
-            logging.error(f"Error analyzing value for option {option_data.get('symbol', 'N/A')}: {e}")
+            logging.error(f"Error fitting volatility smile for {index_name}: {e}")
+            return None
     def shutdown(self):
         logging.info("🔌 Shutting down engine...")
+        self.scheduler.stop()
+        self.strategy_runner.shutdown()
         if self.api_client:
             self.api_client.logout()
         logging.info("Engine has been stopped.")
 
+# Set to the running engine in the threaded deployment mode.
+trading_engine = None
+
+@app.route('/metrics')
+def metrics():
+    """Cycle scheduler and per-strategy timing metrics of the running engine."""
+    if trading_engine is None:
+        return jsonify({'status': 'not running'})
+    return jsonify({
+        'scheduler': trading_engine.scheduler.metrics,
+        'strategies': trading_engine.strategy_runner.timings,
+        'api_cache': trading_engine.api_client.cache_stats(),
+        'api_breakers': trading_engine.api_client.breaker_stats(),
+    })
+
+# --- Profiling ---
+# On-demand diagnostics for the running engine (threaded mode): a sampling
+# profiler of the trading thread that can be toggled at runtime, and the
+# per-call trace of the most recent cycles.
+profiler = SamplingProfiler()
+PROFILER_MIN_INTERVAL_MS = 1.0
+
+@app.route('/profile', methods=['GET'])
+def profile_status():
+    return jsonify(profiler.status())
+
+@app.route('/profile/start', methods=['POST'])
+def profile_start():
+    """Starts sampling the trading thread. Optional `interval_ms` (default 5)."""
+    if trading_engine is None or trading_engine.thread_id is None:
+        abort(409, description="The trading thread is not running in this process.")
+    interval_ms = max(request.args.get('interval_ms', 5.0, type=float), PROFILER_MIN_INTERVAL_MS)
+    try:
+        profiler.start(trading_engine.thread_id, interval_ms / 1000.0)
+    except RuntimeError as e:
+        abort(409, description=str(e))
+    return jsonify(profiler.status())
+
+@app.route('/profile/stop', methods=['POST'])
+def profile_stop():
+    profiler.stop()
+    return jsonify(profiler.status())
+
+@app.route('/profile/download')
+def profile_download():
+    """The collected profile as collapsed stacks, for flamegraph.pl, inferno or speedscope."""
+    response = Response(profiler.collapsed(), mimetype='text/plain')
+    response.headers['Content-Disposition'] = 'attachment; filename=engine.folded'
+    return response
+
+@app.route('/trace')
+def trace():
+    """Per-call timings of the last `n` trading cycles (default 5), newest first."""
+    return jsonify({'cycles': TRACER.last_cycles(max(request.args.get('n', 5, type=int), 1))})
+
 def run_trading_engine():
     """Function to initialize and run the engine."""
-    engine = TradingEngine(config_path='config.ini')
-    engine.run()
+    global trading_engine
+    trading_engine = TradingEngine(config_path='config.ini')
+    trading_engine.run()
+
+def run_sharded_engine(config_path='config.ini'):
+    """
+    Runs the engine in process-sharded mode: SYMBOLS_TO_WATCH is split across
+    worker processes and all fills go to a single portfolio writer process.
+    Blocks while supervising; crashed processes are restarted.
+    """
+    global shard_supervisor
+    config = configparser.ConfigParser()
+    if not config.read(config_path):
+        raise ValueError(f"Configuration file not found at {config_path}")
+    symbols = config['TRADING_ENGINE']['SYMBOLS_TO_WATCH'].split(',')
+    num_shards = config.getint('DEPLOYMENT', 'NUM_SHARDS', fallback=0)
+    shard_supervisor = ShardSupervisor(config_path, symbols, num_shards)
+    shard_supervisor.supervise()
+
+def stop_sharded_engine():
+    """Stops the shard and writer processes; registered for SIGTERM and interpreter exit."""
+    if shard_supervisor is not None:
+        shard_supervisor.stop()
+
+def _handle_sigterm(signum, frame):
+    stop_sharded_engine()
+    sys.exit(0)
 
 if __name__ == '__main__':
     # --- Start the trading logic in a separate thread ---
-    trading_thread = Thread(target=run_trading_engine)
+    # [DEPLOYMENT] MODE = threaded (default) runs every index in this process;
+    # MODE = sharded runs them in supervised worker processes instead.
+    deployment_config = configparser.ConfigParser()
+    deployment_config.read('config.ini')
+    deployment_mode = deployment_config.get('DEPLOYMENT', 'MODE', fallback='threaded').strip().lower()
+    if deployment_mode == 'sharded':
+        # Without these, a restart of this process would leave the writer and shards running.
+        atexit.register(stop_sharded_engine)
+        signal.signal(signal.SIGTERM, _handle_sigterm)
+    trading_thread = Thread(target=run_sharded_engine if deployment_mode == 'sharded' else run_trading_engine)
     trading_thread.daemon = True # Allows main thread to exit even if this thread is running
     trading_thread.start()
 
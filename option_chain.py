@@ -0,0 +1,167 @@
+# /engine/option_chain.py
+# This module defines the compact, NumPy-backed representation of an option
+# chain that is passed between the API client and the engine's stages.
+
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from enum import IntEnum
+
+import numpy as np
+
+EPOCH = date(1970, 1, 1)
+EXPIRY_FORMAT = "%d%b%Y"  # e.g. '28AUG2025', as used by the scrip master and greeks API.
+
+
+class OptionType(IntEnum):
+    """Call/put flag stored in the int8 `option_types` column."""
+    CE = 0
+    PE = 1
+
+
+def to_epoch_day(d):
+    """Converts a date to the number of days since 1970-01-01."""
+    return (d - EPOCH).days
+
+
+def from_epoch_day(epoch_day):
+    """Converts a number of days since 1970-01-01 back to a date."""
+    return EPOCH + timedelta(days=int(epoch_day))
+
+
+def parse_expiry(expiry_str):
+    """Parses a 'DDMMMYYYY' expiry string into an epoch day."""
+    return to_epoch_day(datetime.strptime(expiry_str, EXPIRY_FORMAT).date())
+
+
+@dataclass
+class OptionSeries:
+    """
+    All listed options of one underlying, in columnar form.
+
+    Built once per instrument list refresh so that strikes and expiries are
+    parsed a single time rather than on every cycle.
+    """
+    tokens: np.ndarray        # str
+    symbols: np.ndarray       # str
+    strikes: np.ndarray       # float64, in rupees
+    expiry_days: np.ndarray   # int32, days since epoch
+    option_types: np.ndarray  # int8, OptionType values
+
+    @classmethod
+    def from_instruments(cls, instruments):
+        """Builds the columns from scrip master dictionaries of a single underlying."""
+        return cls(
+            tokens=np.array([item["token"] for item in instruments], dtype=str),
+            symbols=np.array([item["symbol"] for item in instruments], dtype=str),
+            strikes=np.array([float(item["strike"]) / 100.0 for item in instruments], dtype=np.float64),
+            expiry_days=np.array([parse_expiry(item["expiry"]) for item in instruments], dtype=np.int32),
+            option_types=np.array(
+                [OptionType.CE if item["symbol"].endswith("CE") else OptionType.PE for item in instruments],
+                dtype=np.int8,
+            ),
+        )
+
+
+@dataclass
+class OptionChainSnapshot:
+    """
+    One expiry of an option chain for a single cycle.
+
+    Instrument columns are filled by the client when the chain is selected;
+    market columns (ltp, iv and the greeks) start as NaN and are filled in place
+    by `attach_greeks`, which joins on the token->row index instead of merging
+    DataFrames. Rows without market data keep NaN, see `has_quote`.
+    """
+    index_name: str
+    underlying_ltp: float
+    expiry_day: int
+    tokens: np.ndarray
+    symbols: np.ndarray
+    strikes: np.ndarray
+    option_types: np.ndarray
+    ltp: np.ndarray = None
+    iv: np.ndarray = None
+    delta: np.ndarray = None
+    gamma: np.ndarray = None
+    theta: np.ndarray = None
+    vega: np.ndarray = None
+    # True if the underlying LTP or the greeks are a fallback from an earlier,
+    # failed cycle, so the columns may not all describe the same moment.
+    stale: bool = False
+    token_index: dict = field(default=None, repr=False)
+
+    MARKET_FIELDS = ("ltp", "iv", "delta", "gamma", "theta", "vega")
+
+    def __post_init__(self):
+        size = len(self.tokens)
+        for name in self.MARKET_FIELDS:
+            if getattr(self, name) is None:
+                setattr(self, name, np.full(size, np.nan))
+        if self.token_index is None:
+            self.token_index = {token: row for row, token in enumerate(self.tokens.tolist())}
+
+    @classmethod
+    def from_series(cls, index_name, underlying_ltp, expiry_day, series, rows):
+        """Selects `rows` (an index array or boolean mask) of an OptionSeries."""
+        return cls(
+            index_name=index_name,
+            underlying_ltp=underlying_ltp,
+            expiry_day=expiry_day,
+            tokens=series.tokens[rows],
+            symbols=series.symbols[rows],
+            strikes=series.strikes[rows],
+            option_types=series.option_types[rows],
+        )
+
+    def __len__(self):
+        return len(self.tokens)
+
+    @property
+    def expiry_date(self):
+        return from_epoch_day(self.expiry_day)
+
+    @property
+    def expiry_str(self):
+        """Expiry in the broker's 'DDMMMYYYY' format, e.g. '28AUG2025'."""
+        return self.expiry_date.strftime(EXPIRY_FORMAT).upper()
+
+    @property
+    def is_call(self):
+        return self.option_types == OptionType.CE
+
+    @property
+    def has_quote(self):
+        """Rows that received a positive market price from `attach_greeks`."""
+        return self.ltp > 0
+
+    def attach_greeks(self, greeks_data):
+        """
+        Fills the market columns in place from the greeks API records.
+
+        Args:
+            greeks_data (list): Dictionaries with a 'token' plus 'ltp', 'iv' and
+                optionally 'delta', 'gamma', 'theta' and 'vega'.
+
+        Returns:
+            int: The number of records that matched a row of this chain.
+        """
+        matched = 0
+        for record in greeks_data:
+            row = self.token_index.get(str(record.get("token")))
+            if row is None:
+                continue
+            for name in self.MARKET_FIELDS:
+                value = record.get(name)
+                if value is not None:
+                    getattr(self, name)[row] = float(value)
+            matched += 1
+        return matched
+
+    def atm_row(self, mask=None):
+        """Row whose strike is closest to the underlying, optionally within `mask`."""
+        distance = np.abs(self.strikes - self.underlying_ltp)
+        if mask is not None:
+            distance = np.where(mask, distance, np.inf)
+        if len(distance) == 0 or not np.isfinite(distance.min()):
+            return None
+        return int(np.argmin(distance))
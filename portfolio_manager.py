@@ -2,14 +2,18 @@
 # This module handles all database interactions and manages the state
 # of the virtual portfolio.
 
+import csv
+import io
 import logging
 import os
 from datetime import datetime
 
 from sqlalchemy import (create_engine, Column, Integer, String, Float,
-                        DateTime, inspect)
+                        DateTime, Index, and_, event, func, inspect, or_, text)
 from sqlalchemy.orm import declarative_base, sessionmaker
 
+from profiler import traced
+
 # --- Configure Logging ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -33,6 +37,14 @@ class Holding(Base):
     def __repr__(self):
         return f"<Holding(symbol='{self.symbol}', quantity={self.quantity}, avg_price={self.average_price})>"
 
+    def to_dict(self):
+        return {
+            'symbol': self.symbol,
+            'quantity': self.quantity,
+            'average_price': self.average_price,
+            'last_updated': self.last_updated.isoformat() if self.last_updated else None,
+        }
+
 class TradeHistory(Base):
     """
     Represents a log of every trade executed.
@@ -46,9 +58,23 @@ class TradeHistory(Base):
     quantity = Column(Integer, nullable=False)
     price = Column(Float, nullable=False)
     reason = Column(String) # e.g., "Price below fair value by 5.2%"
+    strategy = Column(String) # Name of the strategy that generated the trade, e.g., "value_buy"
+
+    # Support keyset pagination (newest first) and per-symbol filtering.
+    __table_args__ = (
+        Index('ix_trade_history_timestamp_id', 'timestamp', 'id'),
+        Index('ix_trade_history_symbol_timestamp', 'symbol', 'timestamp'),
+    )
+
+    EXPORT_COLUMNS = ('id', 'timestamp', 'symbol', 'trade_type', 'quantity', 'price', 'reason', 'strategy')
 
     def __repr__(self):
-        return f"<Trade(time='{self.timestamp}', type='{self.trade_type}', symbol='{self.symbol}', qty={self.quantity}, price={self.price})>"
+        return f"<Trade(time='{self.timestamp}', type='{self.trade_type}', symbol='{self.symbol}', qty={self.quantity}, price={self.price}, strategy='{self.strategy}')>"
+
+    def to_dict(self):
+        record = {column: getattr(self, column) for column in self.EXPORT_COLUMNS}
+        record['timestamp'] = self.timestamp.isoformat()
+        return record
 
 
 class PortfolioManager:
@@ -56,14 +82,23 @@ class PortfolioManager:
     Provides an interface to manage all portfolio operations,
     such as recording trades and querying holdings.
     """
-    def __init__(self, db_file=DB_FILE):
+    def __init__(self, db_file=DB_FILE, read_only=False):
         """
         Initializes the PortfolioManager and connects to the database.
         It will create the database and tables if they don't exist.
+
+        With `read_only=True` the database is opened read-only and its schema is
+        left alone, for readers (e.g. the web API) in deployments where another
+        process owns the database. Writes then fail.
         """
         self.db_file = db_file
-        self.engine = create_engine(f'sqlite:///{self.db_file}')
-        self._create_tables_if_not_exist()
+        if read_only:
+            self.engine = create_engine(f'sqlite:///file:{self.db_file}?mode=ro&uri=true')
+        else:
+            self.engine = create_engine(f'sqlite:///{self.db_file}')
+            # WAL lets read endpoints query the database while trades are being written.
+            event.listen(self.engine, 'connect', lambda dbapi_connection, _: dbapi_connection.execute('PRAGMA journal_mode=WAL'))
+            self._create_tables_if_not_exist()
         
         # Session is the object we use to talk to the database
         self.Session = sessionmaker(bind=self.engine)
@@ -79,8 +114,18 @@ class PortfolioManager:
             Base.metadata.create_all(self.engine)
         else:
             logging.info(f"Database '{self.db_file}' and tables already exist.")
+            # Databases created before trades were tagged by strategy lack the column.
+            columns = {column['name'] for column in inspector.get_columns('trade_history')}
+            if 'strategy' not in columns:
+                logging.info("Adding 'strategy' column to trade_history.")
+                with self.engine.begin() as connection:
+                    connection.execute(text("ALTER TABLE trade_history ADD COLUMN strategy VARCHAR"))
+            # Indexes added after the table was first created.
+            for index in TradeHistory.__table__.indexes:
+                index.create(bind=self.engine, checkfirst=True)
 
-    def record_trade(self, symbol, trade_type, quantity, price, reason=""):
+    @traced("PortfolioManager.record_trade")
+    def record_trade(self, symbol, trade_type, quantity, price, reason="", strategy=None):
         """
         Records a new trade in the trade_history table and updates the
         holdings table accordingly.
@@ -91,6 +136,7 @@ class PortfolioManager:
             quantity (int): The number of units traded.
             price (float): The price per unit.
             reason (str, optional): The justification for the trade.
+            strategy (str, optional): The strategy that generated the trade.
         """
         session = self.Session()
         try:
@@ -100,7 +146,8 @@ class PortfolioManager:
                 trade_type=trade_type.upper(),
                 quantity=quantity,
                 price=price,
-                reason=reason
+                reason=reason,
+                strategy=strategy
             )
             session.add(new_trade)
             logging.info(f"RECORDED TRADE: {trade_type.upper()} {quantity} {symbol} @ {price}")
@@ -158,7 +205,10 @@ class PortfolioManager:
             session.close()
 
     def get_trade_history(self):
-        """Retrieves all trade history from the database."""
+        """
+        Retrieves all trade history from the database.
+        Prefer `iter_trade_history` or `get_trade_history_page` for large histories.
+        """
         session = self.Session()
         try:
             history = session.query(TradeHistory).order_by(TradeHistory.timestamp.desc()).all()
@@ -166,6 +216,166 @@ class PortfolioManager:
         finally:
             session.close()
 
+    # --- Paginated / Streaming Reads ---
+    # Trade history is read newest first with keyset pagination on
+    # (timestamp, id): each page is a bounded index range scan, no matter how
+    # deep into the history it is, and rows are returned as plain dicts so no
+    # ORM objects outlive their session.
+
+    @staticmethod
+    def encode_cursor(record):
+        """Builds the opaque cursor pointing just past a trade_history record dict."""
+        return f"{record['timestamp']}_{record['id']}"
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """Inverse of `encode_cursor`. Raises ValueError on a malformed cursor."""
+        timestamp, _, trade_id = cursor.rpartition('_')
+        return datetime.fromisoformat(timestamp), int(trade_id)
+
+    def _trade_history_query(self, session, symbol=None, start=None, end=None, after=None):
+        query = session.query(TradeHistory)
+        if symbol:
+            query = query.filter(TradeHistory.symbol == symbol)
+        if start:
+            query = query.filter(TradeHistory.timestamp >= start)
+        if end:
+            query = query.filter(TradeHistory.timestamp < end)
+        if after:
+            timestamp, trade_id = after
+            query = query.filter(or_(
+                TradeHistory.timestamp < timestamp,
+                and_(TradeHistory.timestamp == timestamp, TradeHistory.id < trade_id),
+            ))
+        return query.order_by(TradeHistory.timestamp.desc(), TradeHistory.id.desc())
+
+    def get_trade_history_page(self, limit=100, cursor=None, symbol=None, start=None, end=None):
+        """
+        Retrieves one page of trade history, newest first.
+
+        Args:
+            limit (int): Maximum number of trades to return.
+            cursor (str, optional): The `next_cursor` of the previous page.
+            symbol (str, optional): Only return trades for this symbol.
+            start (datetime, optional): Only trades at or after this UTC time.
+            end (datetime, optional): Only trades before this UTC time.
+
+        Returns:
+            tuple: (trades, next_cursor) where trades is a list of dicts and
+                   next_cursor is None once the last page has been reached.
+        """
+        after = self.decode_cursor(cursor) if cursor else None
+        session = self.Session()
+        try:
+            rows = self._trade_history_query(session, symbol, start, end, after).limit(limit + 1).all()
+            trades = [row.to_dict() for row in rows[:limit]]
+        finally:
+            session.close()
+        next_cursor = self.encode_cursor(trades[-1]) if len(rows) > limit else None
+        return trades, next_cursor
+
+    def iter_trade_history(self, symbol=None, start=None, end=None, chunk_size=1000):
+        """
+        Yields trade history dicts, newest first, fetching `chunk_size` rows at
+        a time so memory stays bounded regardless of the history's size.
+        """
+        cursor = None
+        while True:
+            trades, cursor = self.get_trade_history_page(chunk_size, cursor, symbol, start, end)
+            yield from trades
+            if cursor is None:
+                return
+
+    def iter_holdings(self, chunk_size=1000):
+        """Yields current holdings as dicts, ordered by id, in bounded chunks."""
+        last_id = 0
+        while True:
+            session = self.Session()
+            try:
+                rows = session.query(Holding).filter(Holding.id > last_id).order_by(Holding.id).limit(chunk_size).all()
+                holdings = [row.to_dict() for row in rows]
+                if rows:
+                    last_id = rows[-1].id
+            finally:
+                session.close()
+            yield from holdings
+            if len(rows) < chunk_size:
+                return
+
+    def trade_history_version(self):
+        """
+        A cheap fingerprint of the trade history, suitable for building HTTP
+        ETags without reading the rows themselves. The table is append-only, so
+        the highest id changes with every new trade; SQLite answers max() on
+        the primary key with a single index lookup instead of a scan.
+        """
+        session = self.Session()
+        try:
+            max_id = session.query(func.max(TradeHistory.id)).scalar()
+            return f"{max_id or 0}"
+        finally:
+            session.close()
+
+    def holdings_version(self):
+        """A cheap fingerprint of the holdings table, see `trade_history_version`."""
+        session = self.Session()
+        try:
+            last_updated, count, total_quantity = session.query(
+                func.max(Holding.last_updated), func.count(Holding.id), func.sum(Holding.quantity)).one()
+            return f"{last_updated.isoformat() if last_updated else 0}-{count}-{total_quantity or 0}"
+        finally:
+            session.close()
+
+    # --- Bulk Export ---
+
+    def export_trade_history_csv(self, symbol=None, start=None, end=None, chunk_size=1000):
+        """
+        Yields the trade history as CSV text, one chunk of rows at a time.
+        The generator can be written to a file or streamed as an HTTP response.
+        """
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=TradeHistory.EXPORT_COLUMNS)
+        writer.writeheader()
+        rows_in_buffer = 0
+        for trade in self.iter_trade_history(symbol, start, end, chunk_size):
+            writer.writerow(trade)
+            rows_in_buffer += 1
+            if rows_in_buffer == chunk_size:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                rows_in_buffer = 0
+        yield buffer.getvalue()
+
+    def export_trade_history_parquet(self, file, symbol=None, start=None, end=None, chunk_size=10000):
+        """
+        Writes the trade history to `file` (a path or binary file object) as
+        Parquet, one row group per chunk, so memory stays bounded.
+
+        Requires the optional `pyarrow` package.
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("Parquet export requires the 'pyarrow' package.") from e
+
+        schema = pa.schema([
+            ('id', pa.int64()), ('timestamp', pa.timestamp('us')), ('symbol', pa.string()),
+            ('trade_type', pa.string()), ('quantity', pa.int64()), ('price', pa.float64()),
+            ('reason', pa.string()), ('strategy', pa.string()),
+        ])
+        chunk = []
+        with pq.ParquetWriter(file, schema) as writer:
+            for trade in self.iter_trade_history(symbol, start, end, chunk_size):
+                trade['timestamp'] = datetime.fromisoformat(trade['timestamp'])
+                chunk.append(trade)
+                if len(chunk) == chunk_size:
+                    writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+                    chunk = []
+            if chunk:
+                writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+
 # --- Example Usage ---
 # This demonstrates how to use the PortfolioManager.
 if __name__ == '__main__':
@@ -4,13 +4,19 @@
 
 import logging
 from math import log, sqrt, exp
+
+import numpy as np
+from scipy.optimize import least_squares
 from scipy.stats import norm
 # *** FIX: Import timedelta alongside datetime ***
 from datetime import datetime, timedelta
 
+from profiler import traced
+
 # --- Configure Logging ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+@traced("black_scholes")
 def black_scholes(
     option_type,       # "CE" for Call, "PE" for Put
     S,                 # Current price of the underlying asset (e.g., NIFTY index price)
@@ -73,6 +79,212 @@ def black_scholes(
         return 0.0
 
 
+def time_to_expiry_years(expiry_date, today=None):
+    """
+    Time to expiry in years, using the same day-count as `black_scholes`
+    (calendar days including today, over 365).
+    """
+    today = today or datetime.now().date()
+    return ((expiry_date - today).days + 1) / 365.0
+
+
+@traced("black_scholes_vectorized")
+def black_scholes_vectorized(is_call, S, K, T, r, sigma):
+    """
+    Vectorized Black-Scholes-Merton prices for a whole chain at once.
+
+    Args:
+        is_call (np.ndarray): Boolean array, True for calls and False for puts.
+        S (float): Current price of the underlying asset.
+        K (np.ndarray): Strike prices.
+        T (float or np.ndarray): Time to expiry in years.
+        r (float): Annualized risk-free interest rate.
+        sigma (np.ndarray): Annualized volatilities.
+
+    Returns:
+        np.ndarray: Theoretical prices; NaN where the inputs are invalid.
+    """
+    K = np.asarray(K, dtype=float)
+    sigma = np.asarray(sigma, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sqrt_T = np.sqrt(T)
+        d1 = (np.log(S / K) + (r + 0.5 * sigma ** 2) * T) / (sigma * sqrt_T)
+        d2 = d1 - sigma * sqrt_T
+        discounted_K = K * np.exp(-r * T)
+        call = S * norm.cdf(d1) - discounted_K * norm.cdf(d2)
+        put = discounted_K * norm.cdf(-d2) - S * norm.cdf(-d1)
+    price = np.where(is_call, call, put)
+    price[~((K > 0) & (sigma > 0))] = np.nan
+    return price
+
+
+# --- SVI Volatility Smile ---
+# Raw SVI parameterisation of total implied variance w(k) = sigma^2 * T as a
+# function of log-moneyness k = log(K / F):
+#   w(k) = a + b * (rho * (k - m) + sqrt((k - m)^2 + s^2))
+# Parameters are stored as a numpy array [a, b, rho, m, s].
+SVI_MIN_POINTS = 5
+SVI_MAX_EVALUATIONS = 50  # Caps a cold-start fit at a few milliseconds.
+# Weight, relative to the median observed variance, of a weak pull of b, rho,
+# m and s towards the data-seeded smile. A chain of ~10 strikes around the
+# money cannot tell those apart, so without it the fit wanders along a flat
+# valley and rarely converges within the evaluation budget.
+SVI_PRIOR_WEIGHT = 0.05
+
+
+def svi_total_variance(params, k):
+    """Evaluates the raw SVI total variance at log-moneyness `k`."""
+    a, b, rho, m, s = params
+    d = k - m
+    return a + b * (rho * d + np.sqrt(d * d + s * s))
+
+
+# The optimiser works on unconstrained coordinates [a, log b, atanh rho, m, log s]
+# so that it can use MINPACK's Levenberg-Marquardt, which is several times
+# cheaper per iteration than the bounded trust-region solver.
+def _svi_from_unconstrained(u):
+    a, log_b, atanh_rho, m, log_s = u
+    return np.array([a, np.exp(log_b), np.tanh(atanh_rho), m, np.exp(log_s)])
+
+
+def _svi_to_unconstrained(params):
+    a, b, rho, m, s = params
+    return np.array([a, np.log(max(b, 1e-8)), np.arctanh(np.clip(rho, -0.999, 0.999)), m, np.log(max(s, 1e-8))])
+
+
+def _svi_jacobian(u, k):
+    """Analytical Jacobian of the SVI residuals in unconstrained coordinates."""
+    _, b, rho, m, s = _svi_from_unconstrained(u)
+    d = k - m
+    root = np.sqrt(d * d + s * s)
+    jac = np.empty((k.size, 5))
+    jac[:, 0] = 1.0
+    jac[:, 1] = (rho * d + root) * b
+    jac[:, 2] = b * d * (1.0 - rho * rho)
+    jac[:, 3] = -b * (rho + d / root)
+    jac[:, 4] = b * s * s / root
+    return jac
+
+
+@traced("fit_svi_smile")
+def fit_svi_smile(k, w, initial_params=None):
+    """
+    Fits a raw SVI smile to observed total variances.
+
+    Args:
+        k (np.ndarray): Log-moneyness of each observation.
+        w (np.ndarray): Observed total implied variance (iv^2 * T).
+        initial_params (np.ndarray, optional): Warm start, normally the
+            previous cycle's fit for the same expiry.
+
+    Returns:
+        np.ndarray: Fitted [a, b, rho, m, s], or None if there are too few
+                    points or no converged fit with non-negative variance was found.
+    """
+    k = np.asarray(k, dtype=float)
+    w = np.asarray(w, dtype=float)
+    if k.size < SVI_MIN_POINTS:
+        logging.warning(f"Not enough points ({k.size}) to fit a volatility smile.")
+        return None
+
+    # A warm start that no longer converges (e.g. the smile moved a lot) gets
+    # one more attempt from the data before the fit is given up for the cycle.
+    seed = _svi_initial_guess(k, w)
+    starts = [initial_params, seed] if initial_params is not None else [seed]
+    for start in starts:
+        params = _fit_svi_from(k, w, start, seed)
+        if params is not None:
+            return params
+    logging.warning("Volatility smile fit did not converge to a valid smile.")
+    return None
+
+
+def _svi_initial_guess(k, w):
+    """
+    Seeds a cold-start fit from the data: a symmetric smile (rho = m = 0)
+    matched to a quadratic through the observations, whose curvature near
+    the money is b / (2s) and slope b * rho.
+    """
+    s = max(np.ptp(k) / 2, 1e-3)
+    c2, c1, c0 = np.polyfit(k, w, 2) if k.size >= 3 else (0.0, 0.0, w.mean())
+    b = max(2 * s * c2, 1e-4)
+    rho = float(np.clip(c1 / b, -0.9, 0.9))
+    atm_variance = w[np.argmin(np.abs(k))]
+    return np.array([atm_variance - b * s, b, rho, 0.0, s])
+
+
+def _fit_svi_from(k, w, initial_params, seed):
+    """Runs one fit; returns the parameters only if it converged to a valid smile."""
+    anchor = _svi_to_unconstrained(seed)
+    prior = np.diag(np.array([0.0, 1.0, 1.0, 1.0, 1.0]) * SVI_PRIOR_WEIGHT * np.median(w))
+    try:
+        result = least_squares(
+            lambda u: np.concatenate((svi_total_variance(_svi_from_unconstrained(u), k) - w, prior @ (u - anchor))),
+            _svi_to_unconstrained(initial_params),
+            jac=lambda u: np.vstack((_svi_jacobian(u, k), prior)),
+            method='lm',
+            ftol=1e-6,
+            xtol=1e-6,
+            max_nfev=SVI_MAX_EVALUATIONS,
+        )
+    except ValueError as e:
+        logging.error(f"Volatility smile fit failed: {e}")
+        return None
+    if result.status <= 0:  # Evaluation budget exhausted before converging.
+        return None
+    params = _svi_from_unconstrained(result.x)
+    if not np.all(np.isfinite(params)):
+        return None
+    a, b, rho, _, s = params
+    # The smile's minimum total variance; below zero it is not a valid smile.
+    if a + b * s * np.sqrt(1 - rho * rho) < 0:
+        return None
+    return params
+
+
+@traced("smile_fair_values")
+def smile_fair_values(is_call, S, K, T, r, market_iv, initial_params=None):
+    """
+    Fits a smile for one expiry and prices every option off the fitted surface.
+
+    Only out-of-the-money options (puts below the forward, calls at or above it)
+    are used for the fit since they are the liquid side of the chain. Every
+    option is then priced with the smile volatility at its own strike.
+
+    Args:
+        is_call (np.ndarray): Boolean array, True for calls and False for puts.
+        S (float): Current price of the underlying asset.
+        K (np.ndarray): Strike prices.
+        T (float): Time to expiry in years (shared by the whole expiry).
+        r (float): Annualized risk-free interest rate.
+        market_iv (np.ndarray): Broker implied volatilities (annualized, decimal);
+            non-positive values are treated as missing.
+        initial_params (np.ndarray, optional): Warm start from the previous cycle.
+
+    Returns:
+        tuple: (fair_values, params). fair_values is an array aligned with K
+               (NaN where no price could be produced) and params the fitted SVI
+               parameters, or (None, None) if the smile could not be fitted.
+    """
+    K = np.asarray(K, dtype=float)
+    market_iv = np.asarray(market_iv, dtype=float)
+    if T <= 0:
+        return None, None
+
+    forward = S * exp(r * T)
+    k = np.log(K / forward)
+    otm = np.where(is_call, K >= forward, K < forward)
+    usable = otm & (market_iv > 0) & np.isfinite(market_iv)
+
+    params = fit_svi_smile(k[usable], market_iv[usable] ** 2 * T, initial_params)
+    if params is None:
+        return None, None
+
+    fitted_variance = np.maximum(svi_total_variance(params, k), 0.0)
+    fitted_sigma = np.sqrt(fitted_variance / T)
+    return black_scholes_vectorized(is_call, S, K, T, r, fitted_sigma), params
+
+
 # --- Example Usage ---
 # This demonstrates how to use the pricing model.
 if __name__ == '__main__':
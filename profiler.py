@@ -0,0 +1,189 @@
+# /engine/profiler.py
+# This module provides the on-demand diagnostics behind the engine's profiling
+# endpoints: a sampling profiler for the trading thread, and a tracer that
+# keeps per-call timings of the last few trading cycles.
+
+import functools
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+
+# --- Configure Logging ---
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class SamplingProfiler:
+    """
+    Low-overhead statistical profiler for a single thread.
+
+    A background thread periodically reads the target thread's current stack
+    via sys._current_frames() and counts identical stacks. Nothing is hooked
+    into the profiled code, so the cost is one stack walk per sample and zero
+    when stopped. Results are exported in the "collapsed stack" format
+    understood by flamegraph.pl, inferno and speedscope.
+    """
+    MAX_DEPTH = 128
+
+    def __init__(self):
+        self._stacks = Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.target_thread_id = None
+        self.interval = None
+        self.samples = 0
+        self.started_at = None
+        self.stopped_at = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, target_thread_id, interval_seconds=0.005):
+        """Starts sampling `target_thread_id`, discarding any previous profile."""
+        if self.running:
+            raise RuntimeError("Profiler is already running.")
+        with self._lock:
+            self._stacks = Counter()
+            self.samples = 0
+        self.target_thread_id = target_thread_id
+        self.interval = interval_seconds
+        self.started_at, self.stopped_at = time.time(), None
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample_loop, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        logging.info(f"Sampling profiler started (every {interval_seconds * 1000:.1f}ms).")
+
+    def stop(self):
+        if not self.running:
+            return
+        self._stop.set()
+        self._thread.join()
+        self.stopped_at = time.time()
+        logging.info(f"Sampling profiler stopped after {self.samples} samples.")
+
+    def _sample_loop(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.target_thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.MAX_DEPTH:
+                code = frame.f_code
+                if code is _TRACED_WRAPPER_CODE:  # Hide the @traced shim from flamegraphs.
+                    frame = frame.f_back
+                    continue
+                stack.append(f"{getattr(code, 'co_qualname', code.co_name)} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            key = ";".join(reversed(stack))
+            with self._lock:
+                self._stacks[key] += 1
+                self.samples += 1
+
+    def collapsed(self):
+        """Returns the profile as collapsed stacks: one 'frame;frame;... count' line per stack."""
+        with self._lock:
+            return "".join(f"{stack} {count}\n" for stack, count in self._stacks.most_common())
+
+    def status(self):
+        return {
+            'running': self.running,
+            'interval_ms': self.interval * 1000 if self.interval else None,
+            'samples': self.samples,
+            'distinct_stacks': len(self._stacks),
+            'started_at': datetime.fromtimestamp(self.started_at).isoformat() if self.started_at else None,
+            'stopped_at': datetime.fromtimestamp(self.stopped_at).isoformat() if self.stopped_at else None,
+        }
+
+
+class CycleTracer:
+    """
+    Keeps per-call timings for the last `max_cycles` trading cycles.
+
+    A cycle is opened and closed by the thread that runs it; only calls made
+    on that thread through a @traced function are recorded, so requests served
+    by the web server in the meantime do not pollute the trace.
+    """
+    MAX_CALLS_PER_CYCLE = 2000
+
+    def __init__(self, max_cycles=50):
+        self._cycles = deque(maxlen=max_cycles)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def start_cycle(self):
+        self._local.cycle = {
+            'started_at': datetime.now().isoformat(),
+            '_start': time.perf_counter(),
+            'calls': [],
+            'dropped_calls': 0,
+        }
+
+    def end_cycle(self):
+        cycle = getattr(self._local, 'cycle', None)
+        if cycle is None:
+            return
+        self._local.cycle = None
+        cycle['duration_ms'] = round((time.perf_counter() - cycle.pop('_start')) * 1000, 3)
+        summary = {}
+        for call in cycle['calls']:
+            entry = summary.setdefault(call['name'], {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            entry['count'] += 1
+            entry['total_ms'] = round(entry['total_ms'] + call['ms'], 3)
+            entry['max_ms'] = max(entry['max_ms'], call['ms'])
+        cycle['summary'] = summary
+        with self._lock:
+            self._cycles.append(cycle)
+
+    def record(self, name, start, elapsed):
+        """Adds a call to the current thread's cycle, if one is open."""
+        cycle = getattr(self._local, 'cycle', None)
+        if cycle is None:
+            return
+        if len(cycle['calls']) >= self.MAX_CALLS_PER_CYCLE:
+            cycle['dropped_calls'] += 1
+            return
+        cycle['calls'].append({
+            'name': name,
+            'offset_ms': round((start - cycle['_start']) * 1000, 3),
+            'ms': round(elapsed * 1000, 3),
+        })
+
+    @property
+    def active(self):
+        return getattr(self._local, 'cycle', None) is not None
+
+    def last_cycles(self, n):
+        """Returns the most recent `n` completed cycles, newest first."""
+        with self._lock:
+            return list(reversed(self._cycles))[:n]
+
+
+# The process-wide tracer the engine and the @traced functions share.
+TRACER = CycleTracer()
+
+
+def traced(name):
+    """
+    Decorator recording each call's duration in the current trading cycle's
+    trace under `name`. Outside a traced cycle it adds only a thread-local lookup.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not TRACER.active:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                TRACER.record(name, start, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+_TRACED_WRAPPER_CODE = traced("")(lambda: None).__code__
@@ -0,0 +1,143 @@
+# /engine/resilience.py
+# This module contains the retry and circuit breaker primitives the API client
+# wraps around broker calls, so transient failures cost milliseconds instead
+# of whole trading cycles.
+
+import logging
+import random
+import threading
+import time
+
+# --- Configure Logging ---
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class BrokerError(Exception):
+    """A broker request failed or returned an unusable response."""
+
+
+class CircuitOpenError(BrokerError):
+    """The endpoint's circuit breaker is open, so the request was not attempted."""
+
+
+class BrokerRejectedError(BrokerError):
+    """
+    The broker answered but refused the request (e.g. an unknown expiry).
+    Retrying cannot help, and since the endpoint is evidently up it does not
+    count against the circuit breaker either.
+    """
+
+
+class CircuitBreaker:
+    """
+    Per-endpoint circuit breaker.
+
+    After `failure_threshold` consecutive failures the breaker opens and calls
+    are rejected immediately for `reset_timeout` seconds. It then half-opens
+    and lets a single trial call through: success closes it again, failure
+    re-opens it for another timeout.
+    """
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self.rejected = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Returns True if a call may be attempted now."""
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logging.info(f"Circuit '{self.name}' closed again.")
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.times_opened += 1
+                    logging.warning(f"Circuit '{self.name}' opened after {self.consecutive_failures} consecutive failures.")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'times_opened': self.times_opened,
+                'rejected': self.rejected,
+            }
+
+
+def call_with_retry(fn, breaker=None, attempts=3, base_delay=0.2, max_delay=2.0, deadline=None):
+    """
+    Calls `fn()` with jittered exponential backoff between attempts.
+
+    Args:
+        fn (callable): The call to make; any exception other than
+            BrokerRejectedError counts as a failure and is retried.
+        breaker (CircuitBreaker, optional): Consulted before, and updated after, every attempt.
+        attempts (int): Maximum number of attempts.
+        base_delay (float): Upper bound of the first backoff; doubles per attempt.
+        max_delay (float): Cap on any single backoff.
+        deadline (float, optional): Epoch seconds after which no further retry
+            is started (e.g. the end of the current trading cycle).
+
+    Returns:
+        The result of the first successful call.
+
+    Raises:
+        CircuitOpenError: If the breaker rejected the call.
+        BrokerRejectedError: As soon as the broker refuses the request.
+        Exception: The last failure once attempts or time have run out.
+    """
+    for attempt in range(attempts):
+        if breaker is not None and not breaker.allow():
+            raise CircuitOpenError(f"Circuit '{breaker.name}' is open.")
+        try:
+            result = fn()
+        except BrokerRejectedError:
+            if breaker is not None:
+                breaker.record_success()
+            raise
+        except Exception as e:
+            if breaker is not None:
+                breaker.record_failure()
+            if attempt == attempts - 1:
+                raise
+            # "Full jitter": spreads retries out so they don't arrive in lockstep.
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+            if deadline is not None and time.time() + delay >= deadline:
+                logging.warning(f"Not retrying after '{e}': the cycle deadline would be exceeded.")
+                raise
+            logging.warning(f"Attempt {attempt + 1}/{attempts} failed: {e}. Retrying in {delay:.2f}s...")
+            time.sleep(delay)
+        else:
+            if breaker is not None:
+                breaker.record_success()
+            return result
@@ -0,0 +1,219 @@
+# /engine/scheduler.py
+# This module decides *when* the trading loop runs: an exchange calendar that
+# knows NSE sessions and holidays, and a deadline-based cycle scheduler that
+# keeps cycles aligned to wall-clock boundaries.
+
+import logging
+import math
+import threading
+import time
+from datetime import date, datetime, timedelta, time as dt_time
+
+import pytz
+
+# --- Configure Logging ---
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+IST = pytz.timezone('Asia/Kolkata')
+MARKET_OPEN_TIME = dt_time(9, 15)
+MARKET_CLOSE_TIME = dt_time(15, 30)
+
+# --- NSE Trading Holidays ---
+# Weekday holidays from the exchange's annual circulars. Update this set when
+# the next year's list is published; additional dates can also be supplied
+# through the HOLIDAYS key of the [MARKET_CALENDAR] config section.
+NSE_HOLIDAYS = frozenset({
+    # 2025
+    date(2025, 2, 26),   # Mahashivratri
+    date(2025, 3, 14),   # Holi
+    date(2025, 3, 31),   # Id-Ul-Fitr (Ramzan Eid)
+    date(2025, 4, 10),   # Shri Mahavir Jayanti
+    date(2025, 4, 14),   # Dr. Baba Saheb Ambedkar Jayanti
+    date(2025, 4, 18),   # Good Friday
+    date(2025, 5, 1),    # Maharashtra Day
+    date(2025, 8, 15),   # Independence Day
+    date(2025, 8, 27),   # Ganesh Chaturthi
+    date(2025, 10, 2),   # Mahatma Gandhi Jayanti / Dussehra
+    date(2025, 10, 21),  # Diwali Laxmi Pujan
+    date(2025, 10, 22),  # Diwali Balipratipada
+    date(2025, 11, 5),   # Prakash Gurpurb Sri Guru Nanak Dev
+    date(2025, 12, 25),  # Christmas
+    # 2026
+    date(2026, 1, 15),   # Municipal corporation elections (Maharashtra)
+    date(2026, 1, 26),   # Republic Day
+    date(2026, 3, 3),    # Holi
+    date(2026, 3, 26),   # Shri Ram Navami
+    date(2026, 3, 31),   # Shri Mahavir Jayanti
+    date(2026, 4, 3),    # Good Friday
+    date(2026, 4, 14),   # Dr. Baba Saheb Ambedkar Jayanti
+    date(2026, 5, 1),    # Maharashtra Day
+    date(2026, 5, 28),   # Bakri Id
+    date(2026, 6, 26),   # Muharram
+    date(2026, 9, 14),   # Ganesh Chaturthi
+    date(2026, 10, 2),   # Mahatma Gandhi Jayanti
+    date(2026, 10, 20),  # Dussehra
+    date(2026, 11, 10),  # Diwali Balipratipada
+    date(2026, 11, 24),  # Prakash Gurpurb Sri Guru Nanak Dev
+    date(2026, 12, 25),  # Christmas
+})
+
+
+class MarketCalendar:
+    """
+    Knows the exchange's regular session and holidays, so the engine can tell
+    whether the market is open and exactly when it next opens.
+
+    The holiday list only covers the years it was written for. Past the last
+    year that has any holiday, every weekday counts as a trading day, and a
+    warning is logged once per such year so the gap doesn't go unnoticed.
+    """
+    def __init__(self, holidays=NSE_HOLIDAYS, open_time=MARKET_OPEN_TIME, close_time=MARKET_CLOSE_TIME, tz=IST):
+        self.holidays = frozenset(holidays)
+        self.open_time = open_time
+        self.close_time = close_time
+        self.tz = tz
+        self.last_covered_year = max((day.year for day in self.holidays), default=None)
+        self._warned_years = set()
+
+    def _check_coverage(self, day):
+        if self.last_covered_year is None or day.year <= self.last_covered_year or day.year in self._warned_years:
+            return
+        self._warned_years.add(day.year)
+        logging.warning(f"No exchange holidays are known for {day.year} (the calendar ends in {self.last_covered_year}). "
+                        f"Holidays will be treated as trading days; add them to NSE_HOLIDAYS or [MARKET_CALENDAR] HOLIDAYS.")
+
+    @classmethod
+    def from_config(cls, config):
+        """Builds the NSE calendar plus any extra HOLIDAYS (YYYY-MM-DD, comma separated) from [MARKET_CALENDAR]."""
+        extra = config.get('MARKET_CALENDAR', 'HOLIDAYS', fallback='')
+        extra_holidays = {date.fromisoformat(d.strip()) for d in extra.split(',') if d.strip()}
+        return cls(holidays=NSE_HOLIDAYS | extra_holidays)
+
+    def is_trading_day(self, day):
+        self._check_coverage(day)
+        return day.weekday() < 5 and day not in self.holidays
+
+    def session_bounds(self, day):
+        """Returns the (open, close) datetimes of the session on `day`."""
+        return (self.tz.localize(datetime.combine(day, self.open_time)),
+                self.tz.localize(datetime.combine(day, self.close_time)))
+
+    def is_open(self, now=None):
+        """Returns (is_open, reason) for `now` (defaults to the current time)."""
+        now = (now or datetime.now(self.tz)).astimezone(self.tz)
+        if now.weekday() > 4: return False, "Weekend"
+        self._check_coverage(now.date())
+        if now.date() in self.holidays: return False, "Exchange Holiday"
+        if self.open_time <= now.time() <= self.close_time: return True, "Market is Open"
+        return False, "Market is Closed"
+
+    def next_open(self, now=None):
+        """Returns the start of the current session if open, otherwise of the next one."""
+        now = (now or datetime.now(self.tz)).astimezone(self.tz)
+        day = now.date()
+        while True:
+            if self.is_trading_day(day):
+                session_open, session_close = self.session_bounds(day)
+                if now <= session_close:
+                    return max(session_open, now)
+            day += timedelta(days=1)
+
+
+class CycleScheduler:
+    """
+    Deadline-based scheduler for the trading loop.
+
+    Cycles start on wall-clock boundaries that are multiples of the interval
+    (e.g. every full minute for 60s), so the period does not drift by however
+    long each cycle takes. If a cycle overruns one or more boundaries, those
+    ticks are skipped rather than run back to back, and counted in `metrics`.
+    While the market is closed, it sleeps until exactly the next session open.
+    """
+    def __init__(self, interval_seconds, calendar):
+        self.interval = interval_seconds
+        self.calendar = calendar
+        self._stop = threading.Event()
+        self._tick = None  # Epoch seconds of the boundary the current cycle belongs to.
+        self._cycle_started = None
+        self.metrics = {
+            'cycles': 0,
+            'overruns': 0,
+            'skipped_ticks': 0,
+            'last_cycle_seconds': None,
+            'max_cycle_seconds': 0.0,
+            'last_start_lag_seconds': None,
+            'next_tick': None,
+        }
+
+    @property
+    def deadline(self):
+        """Epoch seconds by which the current cycle should finish (the next boundary)."""
+        return None if self._tick is None else self._tick + self.interval
+
+    def _next_boundary(self, now):
+        return (math.floor(now / self.interval) + 1) * self.interval
+
+    def _sleep_until(self, target):
+        """Sleeps until epoch `target`; returns False if the scheduler was stopped."""
+        while not self._stop.is_set():
+            remaining = target - time.time()
+            if remaining <= 0:
+                return True
+            self._stop.wait(remaining)
+        return False
+
+    def wait_for_next_cycle(self):
+        """
+        Blocks until the next cycle should start. On a cold start during market
+        hours the first cycle runs immediately; later cycles run on boundaries.
+
+        Returns:
+            bool: True when a cycle should run now, False if the scheduler was stopped.
+        """
+        while not self._stop.is_set():
+            now = time.time()
+            cold_start = self._tick is None
+            target = now if cold_start else self._tick + self.interval
+
+            target_dt = datetime.fromtimestamp(target, self.calendar.tz)
+            market_open, reason = self.calendar.is_open(target_dt)
+            if not market_open:
+                next_open = self.calendar.next_open(target_dt)
+                logging.info(f"Market is currently closed ({reason}). Sleeping until {next_open.isoformat()}...")
+                self.metrics['next_tick'] = next_open.isoformat()
+                if not self._sleep_until(next_open.timestamp()):
+                    return False
+                # The first cycle of the session starts exactly at the open.
+                self._tick = next_open.timestamp() - self.interval
+                continue
+
+            self.metrics['next_tick'] = target_dt.isoformat()
+            if not self._sleep_until(target):
+                return False
+            # A cold-start cycle belongs to the boundary it started after, so the
+            # next cycle lands on the following wall-clock boundary.
+            self._tick = self._next_boundary(target) - self.interval if cold_start else target
+            self._cycle_started = time.time()
+            self.metrics['last_start_lag_seconds'] = round(self._cycle_started - target, 4)
+            return True
+        return False
+
+    def complete_cycle(self):
+        """Records the finished cycle's duration and skips any ticks it overran."""
+        now = time.time()
+        duration = now - self._cycle_started
+        self.metrics['cycles'] += 1
+        self.metrics['last_cycle_seconds'] = round(duration, 4)
+        self.metrics['max_cycle_seconds'] = max(self.metrics['max_cycle_seconds'], round(duration, 4))
+        next_tick = self._tick + self.interval
+        if now >= next_tick:
+            skipped = math.floor((now - next_tick) / self.interval) + 1
+            self.metrics['overruns'] += 1
+            self.metrics['skipped_ticks'] += skipped
+            logging.warning(f"Cycle took {duration:.2f}s, overrunning the {self.interval}s interval. Skipping {skipped} tick(s).")
+            # Realign to the next boundary that is still in the future.
+            self._tick += skipped * self.interval
+        return duration
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,283 @@
+# /engine/sharding.py
+# This module implements the process-sharded deployment mode: the watched
+# indices are split across worker processes, each with its own API client and
+# pricing, while a single writer process owns the portfolio database.
+
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import traceback
+from multiprocessing.managers import SyncManager
+
+from portfolio_manager import DB_FILE, PortfolioManager
+
+# --- Configure Logging ---
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# How often child processes check that the supervising parent is still alive.
+PARENT_CHECK_INTERVAL_SECONDS = 2.0
+
+
+def parent_alive():
+    """True while the process that spawned this one is still running."""
+    parent = multiprocessing.parent_process()
+    return parent is None or parent.is_alive()
+
+
+def _exit_when_orphaned():
+    """Manager-process initializer: exits the queue server if the supervisor dies."""
+    def watch():
+        while parent_alive():
+            time.sleep(PARENT_CHECK_INTERVAL_SECONDS)
+        os._exit(0)
+    threading.Thread(target=watch, name="parent-watchdog", daemon=True).start()
+
+
+class QueuedPortfolioWriter:
+    """
+    Stands in for PortfolioManager inside shard processes.
+
+    Trades are not written directly; they are put on the shared fill queue
+    and applied, in arrival order, by the single portfolio writer process.
+    Each delivered fill is counted in this shard's slot of `fills_sent`, so
+    the supervisor can tell how many were lost if the writer dies.
+    """
+    def __init__(self, fill_queue, fills_sent=None, shard_id=0):
+        self.fill_queue = fill_queue
+        self.fills_sent = fills_sent
+        self.shard_id = shard_id
+
+    def record_trade(self, symbol, trade_type, quantity, price, reason="", strategy=None):
+        self.fill_queue.put((symbol, trade_type, quantity, price, reason, strategy))
+        if self.fills_sent is not None:
+            self.fills_sent[self.shard_id] += 1  # Only this shard writes its slot.
+
+
+def run_portfolio_writer(fill_queue, db_file=DB_FILE, fills_written=None):
+    """Process entry point: the only process that writes to the portfolio database."""
+    logging.info(f"Portfolio writer started (pid {os.getpid()}).")
+    portfolio_manager = PortfolioManager(db_file)
+    while True:
+        try:
+            fill = fill_queue.get(timeout=PARENT_CHECK_INTERVAL_SECONDS)
+        except queue.Empty:
+            # The queue is drained; exit rather than linger if the supervisor is gone.
+            if not parent_alive():
+                logging.warning("Supervisor process is gone. Portfolio writer exiting.")
+                break
+            continue
+        if fill is None:  # Shutdown sentinel from the supervisor.
+            break
+        symbol, trade_type, quantity, price, reason, strategy = fill
+        portfolio_manager.record_trade(symbol, trade_type, quantity, price, reason, strategy=strategy)
+        if fills_written is not None:
+            fills_written.value += 1
+    logging.info("Portfolio writer stopped.")
+
+
+def run_shard(shard_id, symbols, config_path, fill_queue, fills_sent=None):
+    """Process entry point: runs a TradingEngine restricted to `symbols`."""
+    # Imported here so that the writer process does not pay for the engine's imports.
+    from engine import TradingEngine
+
+    logging.info(f"Shard {shard_id} started (pid {os.getpid()}) for {', '.join(symbols)}.")
+    engine = TradingEngine(config_path, symbols=symbols,
+                           portfolio_manager=QueuedPortfolioWriter(fill_queue, fills_sent, shard_id))
+
+    def stop_when_orphaned():
+        while parent_alive():
+            time.sleep(PARENT_CHECK_INTERVAL_SECONDS)
+        logging.warning(f"Supervisor process is gone. Stopping shard {shard_id}.")
+        engine.scheduler.stop()
+
+    threading.Thread(target=stop_when_orphaned, name="parent-watchdog", daemon=True).start()
+    try:
+        engine.run()
+    finally:
+        engine.shutdown()
+
+
+def split_symbols(symbols, num_shards):
+    """Distributes symbols round-robin over at most `num_shards` non-empty shards."""
+    num_shards = max(1, min(num_shards, len(symbols)))
+    return [symbols[i::num_shards] for i in range(num_shards)]
+
+
+class ShardSupervisor:
+    """
+    Starts the portfolio writer and one process per shard, and restarts any of
+    them that die. Restarts back off exponentially per process, and the backoff
+    resets once a process has stayed up for STABLE_RUN_SECONDS.
+
+    Fills travel over a queue served by a manager process rather than a
+    multiprocessing.Queue: the latter's pipe locks are held by whichever
+    process is reading or writing, so a hard-killed writer or shard would
+    leave them locked and silently stall every other process. A proxy
+    connection dies with its process without affecting the others.
+    """
+    SUPERVISE_INTERVAL_SECONDS = 5
+    MIN_RESTART_BACKOFF_SECONDS = 5
+    MAX_RESTART_BACKOFF_SECONDS = 300
+    STABLE_RUN_SECONDS = 600
+
+    def __init__(self, config_path, symbols, num_shards=0, db_file=DB_FILE):
+        """
+        Args:
+            config_path (str): Path to config.ini, re-read by every shard.
+            symbols (list): All indices to watch.
+            num_shards (int): Number of worker processes; 0 means one per index,
+                              capped at the number of CPU cores.
+            db_file (str): The portfolio database owned by the writer process.
+        """
+        self.config_path = config_path
+        self.db_file = db_file
+        if num_shards <= 0:
+            num_shards = min(len(symbols), os.cpu_count() or 1)
+        self.shard_symbols = split_symbols(symbols, num_shards)
+
+        # 'spawn' avoids forking a process that already runs Flask and other threads.
+        self._mp = multiprocessing.get_context('spawn')
+        self._manager = None
+        self.fill_queue = None
+        # Lock-free shared counters: each shard only writes its own slot of
+        # fills_sent and only the writer writes fills_written.
+        self.fills_sent = self._mp.RawArray('q', len(self.shard_symbols))
+        self.fills_written = self._mp.RawValue('q', 0)
+        self.fills_lost = 0
+        self._running = False
+        self._stopped = False
+        # name -> {'process', 'started_at', 'backoff', 'restart_at', 'restarts'}
+        self._processes = {}
+
+    def _start_queue(self):
+        self._manager = SyncManager(ctx=self._mp)
+        self._manager.start(_exit_when_orphaned)
+        self.fill_queue = self._manager.Queue()
+
+    def _queue_alive(self):
+        try:
+            self.fill_queue.qsize()
+            return True
+        except (EOFError, OSError):
+            return False
+
+    def _spawn(self, name):
+        if name == 'writer':
+            target, args = run_portfolio_writer, (self.fill_queue, self.db_file, self.fills_written)
+        else:
+            shard_id = int(name.split('-')[1])
+            target, args = run_shard, (shard_id, self.shard_symbols[shard_id], self.config_path,
+                                       self.fill_queue, self.fills_sent)
+        process = self._mp.Process(target=target, args=args, name=name, daemon=True)
+        process.start()
+        state = self._processes.setdefault(name, {'backoff': self.MIN_RESTART_BACKOFF_SECONDS, 'restarts': 0})
+        state.update(process=process, started_at=time.monotonic(), restart_at=None)
+
+    def start(self):
+        logging.info(f"Starting {len(self.shard_symbols)} shard(s): {self.shard_symbols}")
+        self._running = True
+        self._start_queue()
+        self._spawn('writer')
+        for shard_id in range(len(self.shard_symbols)):
+            self._spawn(f'shard-{shard_id}')
+
+    def _restart_all(self):
+        """Replaces a dead fill queue: every process is restarted against a new one."""
+        logging.error("The fill queue server died. Restarting the writer and all shards with a new queue.")
+        self._account_lost_fills(queued=0)
+        for state in self._processes.values():
+            state['process'].terminate()
+        for state in self._processes.values():
+            state['process'].join()
+        self._start_queue()
+        for name, state in self._processes.items():
+            state['restarts'] += 1
+            self._spawn(name)
+
+    def _account_lost_fills(self, queued=None):
+        """Logs fills that shards delivered but the writer never recorded (e.g. it was killed mid-fill)."""
+        if queued is None:
+            queued = self.fill_queue.qsize()
+        # Sent is read before the queue size, so fills put concurrently can only
+        # make this undercount; it never reports phantom losses.
+        lost = sum(self.fills_sent) - self.fills_written.value - queued - self.fills_lost
+        if lost > 0:
+            self.fills_lost += lost
+            logging.error(f"{lost} fill(s) were lost in flight and not recorded ({self.fills_lost} in total).")
+
+    def _check(self, name, state):
+        process, now = state['process'], time.monotonic()
+        if process.is_alive():
+            if now - state['started_at'] > self.STABLE_RUN_SECONDS:
+                state['backoff'] = self.MIN_RESTART_BACKOFF_SECONDS
+            return
+        if state['restart_at'] is None:
+            state['restart_at'] = now + state['backoff']
+            logging.error(f"Process '{name}' exited with code {process.exitcode}. Restarting in {state['backoff']}s.")
+            state['backoff'] = min(state['backoff'] * 2, self.MAX_RESTART_BACKOFF_SECONDS)
+            if name == 'writer':
+                self._account_lost_fills()
+        elif now >= state['restart_at']:
+            state['restarts'] += 1
+            logging.info(f"Restarting process '{name}' (restart #{state['restarts']}).")
+            self._spawn(name)
+
+    def supervise(self):
+        """Blocking supervision loop, designed to run in a background thread."""
+        if not self._running:
+            self.start()
+        while self._running:
+            try:
+                if not self._queue_alive():
+                    self._restart_all()
+                for name, state in list(self._processes.items()):
+                    if not self._running:  # stop() was called meanwhile; don't restart anything.
+                        break
+                    self._check(name, state)
+            except Exception as e:
+                logging.error(f"Error in shard supervisor: {e}")
+                traceback.print_exc()
+            time.sleep(self.SUPERVISE_INTERVAL_SECONDS)
+
+    def status(self):
+        """Returns a summary of every supervised process, e.g. for a health endpoint."""
+        return {
+            name: {
+                'pid': state['process'].pid,
+                'alive': state['process'].is_alive(),
+                'restarts': state['restarts'],
+                'symbols': self.shard_symbols[int(name.split('-')[1])] if name.startswith('shard-') else None,
+                'fills': ({'written': self.fills_written.value, 'lost': self.fills_lost} if name == 'writer'
+                          else {'sent': self.fills_sent[int(name.split('-')[1])]}),
+            }
+            for name, state in self._processes.items()
+        }
+
+    def stop(self, timeout=10):
+        """
+        Stops the shards, then lets the writer drain the fill queue before exiting.
+        Safe to call more than once, e.g. from both a signal handler and atexit.
+        """
+        if self._stopped:
+            return
+        self._stopped = True
+        self._running = False
+        logging.info("Stopping shard processes...")
+        for name, state in self._processes.items():
+            if name != 'writer':
+                state['process'].terminate()
+        for name, state in self._processes.items():
+            if name != 'writer':
+                state['process'].join(timeout)
+        writer = self._processes.get('writer')
+        if writer:
+            try:
+                self.fill_queue.put(None, timeout=timeout)
+            except (queue.Full, EOFError, OSError):
+                pass
+            writer['process'].join(timeout)
+        if self._manager is not None:
+            self._manager.shutdown()
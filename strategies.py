@@ -0,0 +1,254 @@
+# /engine/strategies.py
+# This module defines the strategy plugin interface and the runner that fans a
+# single per-cycle market snapshot out to every registered strategy.
+
+import logging
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import time as dt_time
+
+import numpy as np
+
+from option_chain import OptionType
+
+# --- Configure Logging ---
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+@dataclass
+class TradeSignal:
+    """A trade a strategy wants to make. The runner records it, tagged with the strategy name."""
+    symbol: str
+    trade_type: str
+    quantity: int
+    price: float
+    reason: str = ""
+
+
+@dataclass
+class StrategyContext:
+    """
+    Everything a strategy may look at for one index in one cycle.
+
+    It is prepared once by the engine and shared read-only by all strategies,
+    so adding a strategy adds neither broker calls nor data preparation.
+    """
+    snapshot: object       # OptionChainSnapshot with greeks attached.
+    fair_values: object    # np.ndarray aligned with the snapshot rows, or None if the smile fit failed.
+    iv_tracker: dict       # The index's session {'high': ..., 'low': ...} IV range, or None.
+    now: object            # Timezone-aware datetime (IST) of the cycle.
+    stale: bool = False    # True if part of the market data is a fallback from an earlier cycle.
+
+
+# --- Strategy Registry ---
+# Maps a strategy's name to its class. Strategies register themselves with the
+# @register_strategy decorator and are instantiated by `load_strategies`.
+STRATEGY_REGISTRY = {}
+
+
+def register_strategy(cls):
+    """Class decorator that makes a Strategy available to `load_strategies`."""
+    STRATEGY_REGISTRY[cls.name] = cls
+    return cls
+
+
+class Strategy:
+    """
+    Base class for trading strategies.
+
+    Subclasses set `name` and `CONFIG_SECTION`, read their settings from that
+    section of config.ini in `__init__`, and implement `on_snapshot`.
+    Strategies must not call the broker or the portfolio directly; they return
+    TradeSignals and the runner records them.
+    """
+    name = None
+    CONFIG_SECTION = None
+    ENABLED_BY_DEFAULT = False
+    # Whether the strategy may run on a worker thread alongside the others.
+    PARALLEL = True
+    # Whether the strategy also runs on cycles whose market data is partly a
+    # fallback from an earlier cycle; overridable with ALLOW_STALE_DATA in its section.
+    ALLOW_STALE_DATA = False
+
+    def __init__(self, config):
+        self.config = config
+        self.allow_stale_data = config.getboolean(self.CONFIG_SECTION, 'ALLOW_STALE_DATA', fallback=self.ALLOW_STALE_DATA)
+
+    def _setting(self, key, convert):
+        """
+        Reads `key` from the strategy's own section, falling back to the legacy
+        [TRADING_ENGINE] section only when the strategy section doesn't set it.
+        Raises configparser.NoOptionError if neither section has the key.
+        """
+        value = self.config.get(self.CONFIG_SECTION, key, fallback=None)
+        if value is None:
+            value = self.config.get('TRADING_ENGINE', key)
+        return convert(value)
+
+    @classmethod
+    def is_enabled(cls, config):
+        return config.getboolean(cls.CONFIG_SECTION, 'ENABLED', fallback=cls.ENABLED_BY_DEFAULT)
+
+    def on_snapshot(self, context):
+        """
+        Evaluates one index's snapshot.
+
+        Args:
+            context (StrategyContext): The shared market data for the cycle.
+
+        Returns:
+            list: TradeSignals to execute (empty if there is nothing to do).
+        """
+        raise NotImplementedError
+
+
+@register_strategy
+class ValueBuyStrategy(Strategy):
+    """Buys options whose smile-implied fair value is well above the market price."""
+    name = "value_buy"
+    CONFIG_SECTION = "VALUE_STRATEGY"
+    ENABLED_BY_DEFAULT = True
+
+    def __init__(self, config):
+        super().__init__(config)
+        # Fall back to the original [TRADING_ENGINE] keys for existing config files.
+        self.trade_trigger_percentage = self._setting('TRADE_TRIGGER_PERCENTAGE', float)
+        self.trade_quantity = self._setting('TRADE_QUANTITY', int)
+
+    def on_snapshot(self, context):
+        snapshot, fair_values = context.snapshot, context.fair_values
+        if fair_values is None:
+            return []
+        market_price = snapshot.ltp
+        valid = snapshot.has_quote & np.isfinite(fair_values) & (fair_values > 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            price_difference_pct = np.where(valid, (fair_values - market_price) / market_price * 100, np.nan)
+
+        signals = []
+        for row in np.flatnonzero(valid & (price_difference_pct > self.trade_trigger_percentage)):
+            reason = f"Value BUY: Fair value ({fair_values[row]:.2f}) is {price_difference_pct[row]:.2f}% > market price ({market_price[row]:.2f})."
+            logging.info(reason)
+            signals.append(TradeSignal(str(snapshot.symbols[row]), "BUY", self.trade_quantity, float(market_price[row]), reason))
+        return signals
+
+
+@register_strategy
+class ExpiryStraddleStrategy(Strategy):
+    """Buys the ATM straddle late on expiry day when the session IV rank is low."""
+    name = "expiry_straddle"
+    CONFIG_SECTION = "EXPIRY_STRATEGY"
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.max_iv_rank = config.getfloat(self.CONFIG_SECTION, 'MAX_STRADDLE_IV_RANK', fallback=20.0)
+        self.expiry_weekday = config.getint(self.CONFIG_SECTION, 'EXPIRY_WEEKDAY', fallback=3)
+        self.strategy_start_time = dt_time.fromisoformat(config.get(self.CONFIG_SECTION, 'STRATEGY_START_TIME', fallback='14:55:00'))
+        self.trade_quantity = self._setting('TRADE_QUANTITY', int)
+        self.trade_fired_today = {}
+
+    def on_snapshot(self, context):
+        snapshot, now = context.snapshot, context.now
+        index_name = snapshot.index_name
+        if self.trade_fired_today.get(index_name) == now.date(): return []
+        if now.weekday() != self.expiry_weekday or now.time() < self.strategy_start_time: return []
+        logging.info(f"*** ACTIVATING EXPIRY STRADDLE STRATEGY FOR {index_name} ***")
+
+        tracker = context.iv_tracker
+        if not tracker:
+            logging.warning(f"No IV tracker data for {index_name} to calculate rank. Skipping.")
+            return []
+        iv_high, iv_low = tracker['high'], tracker['low']
+        atm_row = snapshot.atm_row(np.isfinite(snapshot.iv))
+        if atm_row is None: return []
+        current_iv = float(snapshot.iv[atm_row])
+        iv_range = iv_high - iv_low
+        session_iv_rank = 50.0 if iv_range == 0 else ((current_iv - iv_low) / iv_range) * 100
+        logging.info(f"Current IV: {current_iv:.2f}, Day's Range: [{iv_low:.2f} - {iv_high:.2f}], Session IV Rank: {session_iv_rank:.2f}%")
+        if session_iv_rank >= self.max_iv_rank:
+            logging.info(f"IV Rank ({session_iv_rank:.2f}%) is NOT below threshold ({self.max_iv_rank}%). No trade.")
+            return []
+
+        logging.info(f"SUCCESS: IV Rank ({session_iv_rank:.2f}%) is below threshold ({self.max_iv_rank}%)! EXECUTING STRADDLE.")
+        at_strike = (snapshot.strikes == snapshot.strikes[atm_row]) & snapshot.has_quote
+        call_rows = np.flatnonzero(at_strike & (snapshot.option_types == OptionType.CE))
+        put_rows = np.flatnonzero(at_strike & (snapshot.option_types == OptionType.PE))
+        if len(call_rows) == 0 or len(put_rows) == 0:
+            logging.warning(f"ATM call/put pair not quoted for {index_name}. Skipping straddle.")
+            return []
+        reason = f"Expiry Straddle: IV Rank {session_iv_rank:.2f}% < {self.max_iv_rank}%"
+        self.trade_fired_today[index_name] = now.date()
+        return [
+            TradeSignal(str(snapshot.symbols[row]), "BUY", self.trade_quantity, float(snapshot.ltp[row]), reason)
+            for row in (call_rows[0], put_rows[0])
+        ]
+
+
+def load_strategies(config):
+    """Instantiates every registered strategy that is enabled in the config."""
+    strategies = [cls(config) for cls in STRATEGY_REGISTRY.values() if cls.is_enabled(config)]
+    logging.info(f"Loaded strategies: {', '.join(s.name for s in strategies) or 'none'}")
+    return strategies
+
+
+class StrategyRunner:
+    """
+    Fans a StrategyContext out to the registered strategies and records the
+    resulting trades in the portfolio, tagged with the originating strategy.
+
+    Strategies marked PARALLEL run concurrently on a shared thread pool; the
+    rest run in the calling thread. Trades are recorded sequentially once all
+    strategies have finished, so strategies never contend for the database.
+    """
+    def __init__(self, strategies, portfolio_manager):
+        self.strategies = strategies
+        self.portfolio_manager = portfolio_manager
+        parallel_count = sum(1 for s in strategies if s.PARALLEL)
+        self._executor = ThreadPoolExecutor(max_workers=parallel_count, thread_name_prefix="strategy") if parallel_count > 1 else None
+        # Per-strategy timing: {name: {'runs', 'last_ms', 'total_ms', 'max_ms', 'errors'}}
+        self.timings = {s.name: {'runs': 0, 'last_ms': 0.0, 'total_ms': 0.0, 'max_ms': 0.0, 'errors': 0} for s in strategies}
+
+    def _run_one(self, strategy, context):
+        start = time.perf_counter()
+        try:
+            return strategy.on_snapshot(context) or []
+        except Exception as e:
+            self.timings[strategy.name]['errors'] += 1
+            logging.error(f"Strategy '{strategy.name}' failed on {context.snapshot.index_name}: {e}")
+            logging.error(traceback.format_exc())
+            return []
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            timing = self.timings[strategy.name]
+            timing['runs'] += 1
+            timing['last_ms'] = elapsed_ms
+            timing['total_ms'] += elapsed_ms
+            timing['max_ms'] = max(timing['max_ms'], elapsed_ms)
+
+    def run(self, context):
+        """Runs every strategy on the context and records their trades."""
+        strategies = self.strategies
+        if context.stale:
+            strategies = [s for s in strategies if s.allow_stale_data]
+            logging.warning(f"Market data for {context.snapshot.index_name} is partly stale this cycle. "
+                            f"Skipping strategies: {', '.join(s.name for s in self.strategies if not s.allow_stale_data) or 'none'}.")
+
+        if self._executor:
+            futures = {s.name: self._executor.submit(self._run_one, s, context) for s in strategies if s.PARALLEL}
+            results = {s.name: self._run_one(s, context) for s in strategies if not s.PARALLEL}
+            results.update({name: future.result() for name, future in futures.items()})
+        else:
+            results = {s.name: self._run_one(s, context) for s in strategies}
+
+        for strategy in strategies:
+            for signal in results[strategy.name]:
+                self.portfolio_manager.record_trade(
+                    signal.symbol, signal.trade_type, signal.quantity, signal.price, signal.reason,
+                    strategy=strategy.name)
+        logging.debug(f"Strategy timings for {context.snapshot.index_name}: "
+                      + ", ".join(f"{name}={t['last_ms']:.2f}ms" for name, t in self.timings.items()))
+
+    def shutdown(self):
+        if self._executor:
+            self._executor.shutdown(wait=False)